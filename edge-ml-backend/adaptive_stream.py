@@ -0,0 +1,119 @@
+import logging
+from typing import NamedTuple, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamLevel(NamedTuple):
+    """One rung of the per-viewer quality ladder"""
+    fps: float
+    jpeg_quality: int
+    width: int
+
+
+# Lowest to highest; the 3 fps / q85 / 800 px rung matches the original fixed stream
+DEFAULT_STREAM_LEVELS = [
+    StreamLevel(fps=1.0, jpeg_quality=40, width=320),
+    StreamLevel(fps=2.0, jpeg_quality=55, width=480),
+    StreamLevel(fps=3.0, jpeg_quality=70, width=640),
+    StreamLevel(fps=3.0, jpeg_quality=85, width=800),
+    StreamLevel(fps=6.0, jpeg_quality=85, width=800),
+    StreamLevel(fps=10.0, jpeg_quality=85, width=800),
+]
+
+
+class AdaptiveRateController:
+    """
+    Per-viewer controller that steps frame rate, JPEG quality and width up or
+    down the level ladder based on how long each send takes and how many
+    frames were published while it was in flight (the viewer's backlog).
+    Frames that pile up behind a slow viewer are skipped, never queued.
+    """
+
+    def __init__(self, levels: Optional[List[StreamLevel]] = None, start_level=None,
+                 downgrade_ratio=0.8, upgrade_ratio=0.3, upgrade_after=10, max_backlog=2):
+        self.levels = list(levels or DEFAULT_STREAM_LEVELS)
+        if not self.levels:
+            raise ValueError("at least one stream level is required")
+        if start_level is None:
+            start_level = len(self.levels) // 2
+        self.level_index = max(0, min(start_level, len(self.levels) - 1))
+
+        # A send slower than downgrade_ratio * frame interval steps down;
+        # upgrade_after consecutive sends faster than upgrade_ratio * interval step up
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.upgrade_after = upgrade_after
+        self.max_backlog = max_backlog
+
+        self._fast_sends = 0
+        # Doubles after every downgrade so a viewer sitting right at link
+        # capacity backs off probing instead of oscillating between levels
+        self._upgrade_threshold = upgrade_after
+        self._sends_since_downgrade = 0
+
+        # Counters
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.throughput_bps = 0.0  # Exponentially weighted send throughput
+        self.level_changes = 0
+
+    @property
+    def level(self) -> StreamLevel:
+        return self.levels[self.level_index]
+
+    @property
+    def frame_interval(self):
+        return 1.0 / self.level.fps if self.level.fps > 0 else 0
+
+    def record_send(self, num_bytes, send_seconds, backlog):
+        """Account for one sent frame and adapt the level; returns the level to use next"""
+        self.frames_sent += 1
+        self.bytes_sent += num_bytes
+        self.frames_dropped += max(0, backlog)
+
+        if send_seconds > 0:
+            sample = num_bytes / send_seconds
+            self.throughput_bps = sample if self.throughput_bps == 0 else 0.8 * self.throughput_bps + 0.2 * sample
+
+        interval = self.frame_interval
+        self._sends_since_downgrade += 1
+        if self._sends_since_downgrade >= 4 * self.upgrade_after:
+            self._upgrade_threshold = self.upgrade_after
+
+        if send_seconds > self.downgrade_ratio * interval or backlog > self.max_backlog:
+            self._fast_sends = 0
+            self._sends_since_downgrade = 0
+            self._upgrade_threshold = min(self._upgrade_threshold * 2, self.upgrade_after * 8)
+            self._step(-1)
+        elif send_seconds < self.upgrade_ratio * interval:
+            self._fast_sends += 1
+            if self._fast_sends >= self._upgrade_threshold:
+                self._fast_sends = 0
+                self._step(1)
+        else:
+            self._fast_sends = 0
+
+        return self.level
+
+    def _step(self, direction):
+        new_index = max(0, min(self.level_index + direction, len(self.levels) - 1))
+        if new_index != self.level_index:
+            self.level_index = new_index
+            self.level_changes += 1
+            logger.debug(f"Viewer stream level -> {self.level}")
+
+    def get_stats(self):
+        """Get controller counters for status endpoints"""
+        return {
+            "level": self.level_index,
+            "fps": self.level.fps,
+            "jpeg_quality": self.level.jpeg_quality,
+            "width": self.level.width,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "bytes_sent": self.bytes_sent,
+            "throughput_bps": round(self.throughput_bps, 1),
+            "level_changes": self.level_changes
+        }
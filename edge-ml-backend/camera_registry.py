@@ -0,0 +1,104 @@
+import threading
+import logging
+from typing import NamedTuple, Optional
+
+from mqtt_stream_client import RTSPMQTTStreamClient
+
+logger = logging.getLogger(__name__)
+
+
+class CameraConfig(NamedTuple):
+    """One camera: its RTSP source and the MQTT topic its Jetson publishes detections on"""
+    camera_id: str
+    rtsp_url: str
+    mqtt_topic: str
+    mqtt_host: str = "127.0.0.1"
+    mqtt_port: int = 1883
+    max_decode_fps: Optional[float] = None  # Per-camera decode rate limit; None = unlimited
+    decode_worker_process: bool = False  # True: capture/decode in a worker process (shared-memory hand-off)
+    source: Optional[str] = None  # Frame source spec overriding rtsp_url (file://..., synthetic://...)
+    mqtt_payload_format: str = "json"  # Detection payload encoding: json, or msgpack if installed
+
+
+class CameraRegistry:
+    """
+    Stream clients for several cameras keyed by camera id.
+    Clients are created on first use; every camera grabs on its own thread
+    but decodes only while holding one of max_concurrent_decodes slots shared
+    by all cameras, and each camera is held to its own max_decode_fps, so a
+    busy camera cannot starve the others of CPU. Cameras decoding out of
+    process use one worker process each instead of a decode slot.
+    """
+
+    def __init__(self, cameras, max_concurrent_decodes=2, on_client_created=None):
+        self.cameras = {camera.camera_id: camera for camera in cameras}
+        self.max_concurrent_decodes = max_concurrent_decodes
+        self.decode_slots = threading.BoundedSemaphore(max_concurrent_decodes)
+        self.on_client_created = on_client_created  # Called with (camera_id, client), e.g. to set callbacks
+
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def camera_ids(self):
+        return list(self.cameras)
+
+    def __contains__(self, camera_id):
+        return camera_id in self.cameras
+
+    def get_client(self, camera_id) -> RTSPMQTTStreamClient:
+        """Stream client for a camera, created on first use (KeyError if unknown)"""
+        camera = self.cameras[camera_id]
+        with self._lock:
+            client = self._clients.get(camera_id)
+            if client is None:
+                client = RTSPMQTTStreamClient(
+                    camera_id=camera.camera_id,
+                    rtsp_url=camera.rtsp_url,
+                    mqtt_topic=camera.mqtt_topic,
+                    mqtt_host=camera.mqtt_host,
+                    mqtt_port=camera.mqtt_port,
+                    max_decode_fps=camera.max_decode_fps,
+                    decode_slots=self.decode_slots,
+                    decode_worker_process=camera.decode_worker_process,
+                    frame_source=camera.source,
+                    payload_format=camera.mqtt_payload_format
+                )
+                if self.on_client_created is not None:
+                    self.on_client_created(camera_id, client)
+                self._clients[camera_id] = client
+            return client
+
+    def clients(self):
+        """(camera_id, client) pairs for cameras whose client has been created"""
+        with self._lock:
+            return list(self._clients.items())
+
+    def stop_all(self):
+        """Stop every running camera"""
+        for camera_id, client in self.clients():
+            if client.is_running:
+                logger.info(f"Stopping camera {camera_id}")
+                client.stop_services()
+
+    def get_stats(self):
+        """Per-camera summary for status endpoints"""
+        with self._lock:
+            clients = dict(self._clients)
+        return {
+            "max_concurrent_decodes": self.max_concurrent_decodes,
+            "cameras": [
+                {
+                    "camera_id": camera_id,
+                    "rtsp_url": camera.rtsp_url,
+                    "source": camera.source,
+                    "mqtt_topic": camera.mqtt_topic,
+                    "mqtt_payload_format": camera.mqtt_payload_format,
+                    "max_decode_fps": camera.max_decode_fps,
+                    "decode_worker_process": camera.decode_worker_process,
+                    "is_running": clients[camera_id].is_running if camera_id in clients else False,
+                    "mqtt_connected": clients[camera_id].mqtt_connected if camera_id in clients else False
+                }
+                for camera_id, camera in self.cameras.items()
+            ]
+        }
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def detections_signature(detections):
+    """Hashable summary of a detection list, used to spot overlay changes"""
+    return tuple(
+        (d.get("person_id"), d.get("name"), tuple(d.get("box", ())), round(float(d.get("confidence", 0))))
+        for d in detections
+    )
+
+
+def detections_tag(detections):
+    """Short hex digest of detections_signature, stable across restarts (for ETags)"""
+    return f"{zlib.crc32(repr(detections_signature(detections)).encode()):08x}"
+
+
+class FrameChangeDetector:
+    """
+    Cheap scene-change test for the render pipeline.
+    Frames are reduced to a tiny grayscale thumbnail and compared with the
+    last accepted one using a vectorised mean absolute difference (0-255).
+    A frame counts as unchanged when that difference is below threshold and
+    the detection set is identical; max_static_seconds forces a refresh so
+    slow drift below the threshold still reaches viewers eventually.
+    """
+
+    def __init__(self, threshold=2.0, thumbnail_size=(32, 18), max_static_seconds=10.0):
+        self.threshold = threshold
+        self.thumbnail_size = thumbnail_size
+        self.max_static_seconds = max_static_seconds
+
+        self._last_thumbnail = None
+        self._last_detections = None
+        self._last_accepted_at = 0.0
+
+        # Counters
+        self.frames_checked = 0
+        self.frames_unchanged = 0
+        self.last_difference = 0.0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def has_changed(self, frame, detections) -> bool:
+        """Return True if frame/detections differ enough to be re-rendered and re-encoded"""
+        self.frames_checked += 1
+        thumbnail = self._thumbnail(frame)
+        signature = detections_signature(detections)
+        now = time.monotonic()
+
+        if self._last_thumbnail is not None and self._last_thumbnail.shape == thumbnail.shape:
+            self.last_difference = float(np.abs(thumbnail - self._last_thumbnail).mean())
+            if (self.last_difference < self.threshold
+                    and signature == self._last_detections
+                    and now - self._last_accepted_at < self.max_static_seconds):
+                self.frames_unchanged += 1
+                return False
+
+        self._last_thumbnail = thumbnail
+        self._last_detections = signature
+        self._last_accepted_at = now
+        return True
+
+    def reset(self):
+        """Forget the reference frame so the next frame is always accepted"""
+        self._last_thumbnail = None
+        self._last_detections = None
+
+    def get_stats(self):
+        """Get detector counters for status endpoints"""
+        return {
+            "threshold": self.threshold,
+            "frames_checked": self.frames_checked,
+            "frames_unchanged": self.frames_unchanged,
+            "last_difference": round(self.last_difference, 3)
+        }
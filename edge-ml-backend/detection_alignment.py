@@ -0,0 +1,147 @@
+import collections
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionMessage(NamedTuple):
+    """One MQTT detection message paired with the closest buffered frame"""
+    timestamp: float  # Capture time of the inferred frame, on the edge clock
+    received_at: float
+    detections: List[dict]
+    frame_seq: int  # Closest buffered frame at arrival, 0 if none was buffered
+    alignment_error: Optional[float]  # Seconds between detection and paired frame
+    frame_dimensions: Optional[dict] = None  # {width, height} the Jetson's boxes refer to
+
+
+class DetectionAligner:
+    """
+    Pairs MQTT detections with the RTSP frames they were inferred from.
+    Jetson timestamps are mapped onto the edge clock (clock_offset) and RTSP
+    grab times are shifted back by the transport latency (rtsp_latency) so both
+    refer to the capture instant. Each message is matched to the closest frame
+    in the ring buffer's history, and the alignment error is tracked.
+    """
+
+    def __init__(self, frame_buffer, clock_offset=0.0, rtsp_latency=0.0, history_size=32):
+        self.frame_buffer = frame_buffer
+        self.clock_offset = clock_offset
+        self.rtsp_latency = rtsp_latency
+
+        self._lock = threading.Lock()
+        self._messages = collections.deque(maxlen=history_size)
+
+        # Metrics
+        self.messages_aligned = 0
+        self.messages_unaligned = 0
+        self.total_alignment_error = 0.0
+        self.max_alignment_error = 0.0
+        self.last_alignment_error = None
+        self.detection_latency = None  # EWMA of receive time - capture time (seconds)
+
+    def parse_timestamp(self, value, received_at):
+        """Convert a Jetson ISO timestamp to edge-clock epoch seconds (received_at if missing)"""
+        if not value:
+            return received_at
+        try:
+            return datetime.fromisoformat(value).timestamp() + self.clock_offset
+        except (TypeError, ValueError):
+            return received_at
+
+    def frame_capture_time(self, buffered):
+        """Estimated capture time of a buffered frame"""
+        return buffered.timestamp - self.rtsp_latency
+
+    def closest_frame(self, capture_time):
+        """Buffered frame whose capture time is closest to capture_time"""
+        frames = self.frame_buffer.snapshot()
+        if not frames:
+            return None
+        return min(frames, key=lambda f: abs(self.frame_capture_time(f) - capture_time))
+
+    def add_message(self, results, detections, received_at=None) -> DetectionMessage:
+        """Record a detection message and pair it with the closest buffered frame"""
+        received_at = received_at if received_at is not None else time.time()
+        capture_time = self.parse_timestamp(results.get("timestamp"), received_at)
+
+        frame = self.closest_frame(capture_time)
+        error = abs(self.frame_capture_time(frame) - capture_time) if frame is not None else None
+        message = DetectionMessage(
+            timestamp=capture_time,
+            received_at=received_at,
+            detections=detections,
+            frame_seq=frame.seq if frame is not None else 0,
+            alignment_error=error,
+            frame_dimensions=results.get("frame_dimensions")
+        )
+
+        with self._lock:
+            self._messages.append(message)
+            latency = received_at - capture_time
+            if self.detection_latency is None:
+                self.detection_latency = latency
+            else:
+                self.detection_latency = 0.9 * self.detection_latency + 0.1 * latency
+
+            if error is None:
+                self.messages_unaligned += 1
+            else:
+                self.messages_aligned += 1
+                self.total_alignment_error += error
+                self.max_alignment_error = max(self.max_alignment_error, error)
+                self.last_alignment_error = error
+
+        return message
+
+    def latest_message(self) -> Optional[DetectionMessage]:
+        """Most recently received detection message"""
+        with self._lock:
+            return self._messages[-1] if self._messages else None
+
+    def detections_at(self, capture_time, tolerance=1.0) -> Optional[DetectionMessage]:
+        """Detection message closest to capture_time, if within tolerance seconds"""
+        with self._lock:
+            if not self._messages:
+                return None
+            best = min(self._messages, key=lambda m: abs(m.timestamp - capture_time))
+        if abs(best.timestamp - capture_time) > tolerance:
+            return None
+        return best
+
+    def delayed_frame(self, tolerance=1.0):
+        """
+        Frame held back by the measured detection latency, plus the detections
+        inferred closest to it. Returns (BufferedFrame, detections) or None.
+        """
+        delay = self.detection_latency or 0.0
+        frame = self.closest_frame(time.time() - max(0.0, delay))
+        if frame is None:
+            return None
+        message = self.detections_at(self.frame_capture_time(frame), tolerance=tolerance)
+        return frame, (message.detections if message is not None else [])
+
+    def clear(self):
+        """Forget buffered detection messages"""
+        with self._lock:
+            self._messages.clear()
+
+    def get_stats(self):
+        """Get alignment metrics for status endpoints"""
+        with self._lock:
+            mean_error = (self.total_alignment_error / self.messages_aligned) if self.messages_aligned else None
+            return {
+                "messages_aligned": self.messages_aligned,
+                "messages_unaligned": self.messages_unaligned,
+                "mean_alignment_error_ms": round(mean_error * 1000, 1) if mean_error is not None else None,
+                "max_alignment_error_ms": round(self.max_alignment_error * 1000, 1),
+                "last_alignment_error_ms": (round(self.last_alignment_error * 1000, 1)
+                                            if self.last_alignment_error is not None else None),
+                "detection_latency_ms": (round(self.detection_latency * 1000, 1)
+                                         if self.detection_latency is not None else None),
+                "clock_offset_s": self.clock_offset,
+                "rtsp_latency_s": self.rtsp_latency
+            }
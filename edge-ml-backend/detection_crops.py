@@ -0,0 +1,95 @@
+import threading
+import logging
+from typing import NamedTuple, Optional
+
+from image_encoders import get_encoder
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class CropTarget(NamedTuple):
+    """Where one person's latest box lies in a buffered frame"""
+    frame: object  # BufferedFrame the crop is taken from
+    person_id: str
+    box: tuple  # (x, y, width, height) in frame pixels, padding applied and clamped
+
+
+class DetectionCropCache:
+    """
+    Close-up crops of detected people for /api/stream/detections/{person_id}/crop.
+    The person's latest box is scaled from the Jetson's frame_dimensions to the
+    frame it was aligned with, and each (frame seq, person, box) crop is cut and
+    encoded at most once, however often it is requested.
+    """
+
+    def __init__(self, stream_client, jpeg_quality=90, padding=0.2, max_entries=64, encoder="jpeg"):
+        self.stream_client = stream_client
+        self.jpeg_quality = jpeg_quality
+        self.padding = padding  # Extra margin around the box, as a fraction of its size
+        self.encoder = get_encoder(encoder)
+        self._cache = LRUCache(max_entries)
+        self._encode_lock = threading.Lock()
+
+        # Counters
+        self.crops_encoded = 0
+
+    @property
+    def content_type(self):
+        return self.encoder.content_type
+
+    def locate(self, person_id) -> Optional[CropTarget]:
+        """Latest box of a person mapped onto a buffered frame, or None if not currently detected"""
+        message = self.stream_client.detection_aligner.latest_message()
+        if message is None:
+            return None
+        detection = next((d for d in message.detections if str(d.get("person_id")) == str(person_id)), None)
+        if detection is None or not detection.get("box"):
+            return None
+
+        # Prefer the frame the detections were inferred from; it may have left the ring since
+        frame_buffer = self.stream_client.frame_buffer
+        buffered = (frame_buffer.get(message.frame_seq) if message.frame_seq else None) or frame_buffer.latest()
+        if buffered is None:
+            return None
+
+        frame_height, frame_width = buffered.frame.shape[:2]
+        dimensions = message.frame_dimensions or {}
+        scale_x = frame_width / (dimensions.get("width") or frame_width)
+        scale_y = frame_height / (dimensions.get("height") or frame_height)
+
+        # Boxes from MQTT are [x, y, w, h] in the Jetson's frame
+        x, y, w, h = detection["box"]
+        pad_x, pad_y = w * self.padding, h * self.padding
+        left = max(0, int((x - pad_x) * scale_x))
+        top = max(0, int((y - pad_y) * scale_y))
+        right = min(frame_width, int((x + w + pad_x) * scale_x))
+        bottom = min(frame_height, int((y + h + pad_y) * scale_y))
+        if right <= left or bottom <= top:
+            return None
+        return CropTarget(frame=buffered, person_id=str(person_id), box=(left, top, right - left, bottom - top))
+
+    def get_crop(self, target: CropTarget) -> Optional[bytes]:
+        """Encoded crop for a located target, cut and encoded on first request"""
+        key = (target.frame.seq, target.person_id, target.box)
+        # Concurrent requests for the same crop wait for one encode
+        with self._encode_lock:
+            image_bytes = self._cache.get(key)
+            if image_bytes is None:
+                left, top, width, height = target.box
+                crop = target.frame.frame[top:top + height, left:left + width]
+                image_bytes = self.encoder.encode(crop, self.jpeg_quality)
+                if image_bytes is None or not self.stream_client.frame_intact(target.frame):
+                    return None
+                self._cache.put(key, image_bytes)
+                self.crops_encoded += 1
+            return image_bytes
+
+    def get_stats(self):
+        """Get crop cache counters for status endpoints"""
+        return {
+            "crops_encoded": self.crops_encoded,
+            "cache_hits": self._cache.hits,
+            "cache_misses": self._cache.misses,
+            "cached_crops": len(self._cache)
+        }
@@ -0,0 +1,133 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def detection_key(detection, seen):
+    """Stable key of a detection: its person_id (or track_id), suffixed when several share one"""
+    base = str(detection.get("person_id") or detection.get("track_id") or detection.get("name") or "unknown")
+    count = seen.get(base, 0) + 1
+    seen[base] = count
+    return base if count == 1 else f"{base}#{count}"
+
+
+class DetectionDeltaEncoder:
+    """
+    Turns the full detected_faces list of every MQTT message into changes
+    against the last state sent: people added, people removed, and people
+    whose box moved more than move_threshold pixels (or whose name changed),
+    keyed by person_id. Messages where nothing moved produce no update.
+
+    The state is shared by every subscriber, so each update is serialized
+    once. A client starts from snapshot() and applies updates in order; a
+    full snapshot is also broadcast every resync_interval seconds. Updates
+    are idempotent upserts/removals, so replaying ones already contained in
+    a snapshot converges to the same state.
+    """
+
+    def __init__(self, move_threshold=4.0, resync_interval=10.0):
+        self.move_threshold = move_threshold
+        self.resync_interval = resync_interval
+
+        self._state = {}  # key -> detection as last sent
+        self._seq = 0
+        self._last_snapshot_at = 0.0
+        self._frame_dimensions = None
+        self._timestamp = ""  # Timestamp of the last message folded in
+        self._lock = threading.Lock()
+
+        # Counters
+        self.updates_sent = 0
+        self.snapshots_sent = 0
+        self.messages_unchanged = 0
+
+    def _changed(self, old, new):
+        if old.get("name") != new.get("name"):
+            return True
+        old_box, new_box = old.get("box") or (), new.get("box") or ()
+        if len(old_box) != len(new_box):
+            return True
+        return any(abs(a - b) > self.move_threshold for a, b in zip(old_box, new_box))
+
+    def update(self, detections, timestamp="", frame_dimensions=None):
+        """
+        Fold a new detection list into the state. Returns a detections_delta
+        message, a detections_snapshot message when a resync is due, or None
+        if nothing changed.
+        """
+        seen = {}
+        incoming = {detection_key(detection, seen): detection for detection in detections}
+
+        with self._lock:
+            added = {key: detection for key, detection in incoming.items() if key not in self._state}
+            updated = {key: detection for key, detection in incoming.items()
+                       if key in self._state and self._changed(self._state[key], detection)}
+            removed = [key for key in self._state if key not in incoming]
+
+            self._state.update(added)
+            self._state.update(updated)
+            for key in removed:
+                del self._state[key]
+            if frame_dimensions is not None:
+                self._frame_dimensions = frame_dimensions
+            self._timestamp = timestamp
+
+            now = time.monotonic()
+            if self.resync_interval and now - self._last_snapshot_at >= self.resync_interval:
+                return self._snapshot_locked(timestamp)
+
+            if not (added or updated or removed):
+                self.messages_unchanged += 1
+                return None
+
+            self._seq += 1
+            self.updates_sent += 1
+            return {
+                "type": "detections_delta",
+                "seq": self._seq,
+                "timestamp": timestamp,
+                "frame_dimensions": self._frame_dimensions,
+                "added": added,
+                "updated": updated,
+                "removed": removed
+            }
+
+    def snapshot(self, timestamp=None):
+        """Full detections_snapshot message of the current state (for new subscribers)"""
+        with self._lock:
+            return self._snapshot_locked(timestamp if timestamp is not None else self._timestamp, broadcast=False)
+
+    def _snapshot_locked(self, timestamp, broadcast=True):
+        if broadcast:
+            self._seq += 1
+            self._last_snapshot_at = time.monotonic()
+            self.snapshots_sent += 1
+        return {
+            "type": "detections_snapshot",
+            "seq": self._seq,
+            "timestamp": timestamp,
+            "frame_dimensions": self._frame_dimensions,
+            "detections": dict(self._state)
+        }
+
+    def clear(self):
+        """Forget tracked people (the stream stopped); new state starts with a snapshot"""
+        with self._lock:
+            self._state.clear()
+            self._timestamp = ""
+            self._last_snapshot_at = 0.0
+
+    def get_stats(self):
+        """Get delta encoding counters for status endpoints"""
+        with self._lock:
+            tracked = len(self._state)
+        return {
+            "tracked": tracked,
+            "updates_sent": self.updates_sent,
+            "snapshots_sent": self.snapshots_sent,
+            "messages_unchanged": self.messages_unchanged,
+            "move_threshold": self.move_threshold,
+            "resync_interval": self.resync_interval
+        }
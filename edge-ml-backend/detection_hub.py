@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+import logging
+
+from wire_formats import get_format, FormatStats
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One subscriber's bounded queue of serialized messages, living on its event loop"""
+
+    def __init__(self, loop, queue_size, topic=None, wire_format="json"):
+        self.loop = loop
+        self.topic = topic
+        self.wire_format = get_format(wire_format)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def _deliver(self, payload):
+        # Slow subscriber: drop its oldest message, newer detections matter more
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def get(self, timeout=None):
+        """Next serialized message (str or bytes), or None if none arrives within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class DetectionHub:
+    """
+    Push-based fan-out of detection and status messages to WebSocket clients.
+    publish() may be called from any thread (the paho callback thread in
+    practice): it hands the message to each subscriber's event loop with one
+    call_soon_threadsafe per loop, and every subscriber gets it in its own
+    bounded queue, so a slow client only loses its own oldest messages.
+
+    Subscribers may pick a topic (e.g. full or delta-encoded detections);
+    messages published without a topic go to everyone. Each subscriber also
+    picks a wire format, and a message is serialized once per format in use,
+    on the publishing thread, whatever the number of subscribers.
+    """
+
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.messages_published = 0
+        self.messages_dropped = 0  # Drops of subscribers that have unsubscribed
+        self.format_stats = FormatStats()
+
+    def subscribe(self, topic=None, wire_format="json") -> Subscription:
+        """Register a subscriber; must be called from the event loop that will consume it"""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size, topic, wire_format)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+                self.messages_dropped += subscription.dropped
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def has_subscribers(self, topic=None):
+        """True if anyone would receive a message published on topic"""
+        with self._lock:
+            return any(topic is None or s.topic == topic for s in self._subscriptions)
+
+    def serialize(self, message, wire_format):
+        """Serialize a message with a WireFormat, recording its size and CPU time"""
+        started = time.perf_counter()
+        payload = wire_format.dumps(message)
+        self.format_stats.record(wire_format.name, len(payload), time.perf_counter() - started)
+        return payload
+
+    def publish(self, message, topic=None):
+        """Deliver a message to every current subscriber of topic (thread-safe, never blocks)"""
+        by_loop = {}
+        with self._lock:
+            for subscription in self._subscriptions:
+                if topic is None or subscription.topic == topic:
+                    by_loop.setdefault(subscription.loop, []).append(subscription)
+        if not by_loop:
+            return
+        self.messages_published += 1
+
+        payloads = {}
+        for subscriptions in by_loop.values():
+            for subscription in subscriptions:
+                wire_format = subscription.wire_format
+                if wire_format.name not in payloads:
+                    payloads[wire_format.name] = self.serialize(message, wire_format)
+
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriptions, payloads)
+            except RuntimeError:
+                # Event loop already closed; its subscribers unsubscribe on their way out
+                pass
+
+    @staticmethod
+    def _deliver(subscriptions, payloads):
+        for subscription in subscriptions:
+            subscription._deliver(payloads[subscription.wire_format.name])
+
+    def get_stats(self):
+        """Get fan-out counters for status endpoints"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            dropped = self.messages_dropped + sum(subscription.dropped for subscription in subscriptions)
+        return {
+            "subscribers": len(subscriptions),
+            "subscribers_by_format": {
+                name: sum(1 for s in subscriptions if s.wire_format.name == name)
+                for name in {s.wire_format.name for s in subscriptions}
+            },
+            "messages_published": self.messages_published,
+            "messages_dropped": dropped,
+            "queued": [subscription.queue.qsize() for subscription in subscriptions],
+            "serialization": self.format_stats.get_stats()
+        }
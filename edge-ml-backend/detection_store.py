@@ -0,0 +1,253 @@
+import base64
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    camera_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    person_id TEXT,
+    name TEXT,
+    confidence REAL,
+    box_x REAL, box_y REAL, box_w REAL, box_h REAL,
+    frame_width INTEGER, frame_height INTEGER
+);
+CREATE INDEX IF NOT EXISTS detections_time ON detections (timestamp, id);
+CREATE INDEX IF NOT EXISTS detections_person ON detections (person_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS detections_camera ON detections (camera_id, timestamp, id);
+"""
+
+COLUMNS = ("id", "camera_id", "timestamp", "person_id", "name", "confidence",
+           "box_x", "box_y", "box_w", "box_h", "frame_width", "frame_height")
+
+
+def encode_cursor(timestamp, row_id):
+    return base64.urlsafe_b64encode(f"{timestamp!r}:{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor returned by query(); ValueError if malformed"""
+    try:
+        timestamp, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        return float(timestamp), int(row_id)
+    except ValueError as e:  # Includes bad base64 and bad UTF-8
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class DetectionStore:
+    """
+    Every detection, one row per detected face, in a local SQLite database
+    (WAL mode, so history queries never block the writer). MQTT threads only
+    enqueue; one background thread writes rows in batches of up to batch_size
+    per transaction. When the queue is full new messages are dropped and
+    counted rather than blocking the caller.
+
+    Queries use keyset pagination on (timestamp, id), which every index ends
+    with, so each page costs the same however deep the cursor is.
+    """
+
+    def __init__(self, path="detections.db", batch_size=500, flush_interval=0.5, queue_size=10000,
+                 retention_seconds=None):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_seconds  # None keeps everything
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()  # Per-thread read connections
+
+        # Control variables
+        self._stop_event = None
+        self._thread = None
+
+        # Counters
+        self.rows_written = 0
+        self.batches_written = 0
+        self.messages_dropped = 0
+        self.rows_pruned = 0
+        self.last_batch_ms = None
+
+    # ---- lifecycle ----
+
+    @property
+    def is_running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        if self.is_running:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._writer_loop, args=(self._stop_event,), daemon=True)
+        self._thread.start()
+        logger.info(f"Detection store started at {self.path}")
+
+    def stop(self):
+        """Flush queued detections and stop the writer"""
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        logger.info("Detection store stopped")
+
+    # ---- writer ----
+
+    def record(self, camera_id, timestamp, detections, frame_dimensions=None):
+        """Queue one MQTT message's detections for storage (never blocks the caller)"""
+        if not detections or not self.is_running:
+            return
+        try:
+            self._queue.put_nowait((camera_id, timestamp, detections, frame_dimensions or {}))
+        except queue.Full:
+            self.messages_dropped += 1
+
+    @staticmethod
+    def _rows(camera_id, timestamp, detections, frame_dimensions):
+        for detection in detections:
+            box = list(detection.get("box") or ())[:4]
+            box += [None] * (4 - len(box))
+            person_id = detection.get("person_id")
+            yield (camera_id, timestamp, str(person_id) if person_id is not None else None,
+                   detection.get("name"), detection.get("confidence"), *box,
+                   frame_dimensions.get("width"), frame_dimensions.get("height"))
+
+    def _writer_loop(self, stop_event):
+        connection = self._connect()
+        last_pruned = 0.0
+        try:
+            while not stop_event.is_set() or not self._queue.empty():
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                # Drain whatever else is waiting, up to batch_size messages per transaction
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                started = time.perf_counter()
+                rows = [row for message in batch for row in self._rows(*message)]
+                try:
+                    with connection:
+                        connection.executemany(
+                            f"INSERT INTO detections ({', '.join(COLUMNS[1:])}) "
+                            f"VALUES ({', '.join('?' * (len(COLUMNS) - 1))})",
+                            rows
+                        )
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing detection batch: {e}")
+                    continue
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+
+                if self.retention_seconds and time.monotonic() - last_pruned > 60:
+                    last_pruned = time.monotonic()
+                    self._prune(connection)
+        finally:
+            connection.close()
+
+    def _prune(self, connection):
+        try:
+            with connection:
+                cursor = connection.execute("DELETE FROM detections WHERE timestamp < ?",
+                                            (time.time() - self.retention_seconds,))
+            self.rows_pruned += cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning detection history: {e}")
+
+    # ---- queries ----
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            connection.row_factory = sqlite3.Row
+        return connection
+
+    def query(self, start=None, end=None, camera_id=None, person_id=None, min_confidence=None,
+              cursor: Optional[str] = None, limit=100):
+        """
+        Detections ordered by (timestamp, id), at most limit of them, plus the
+        cursor of the next page (None on the last page). ValueError on a bad cursor.
+        """
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        if camera_id is not None:
+            conditions.append("camera_id = ?")
+            params.append(camera_id)
+        if person_id is not None:
+            conditions.append("person_id = ?")
+            params.append(person_id)
+        if min_confidence is not None:
+            conditions.append("confidence >= ?")
+            params.append(min_confidence)
+        if cursor:
+            conditions.append("(timestamp, id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM detections"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, id LIMIT ?"
+        params.append(limit + 1)  # One extra row tells whether another page exists
+
+        rows = self._reader().execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+        detections = [
+            {
+                "id": row["id"],
+                "camera_id": row["camera_id"],
+                "timestamp": row["timestamp"],
+                "person_id": row["person_id"],
+                "name": row["name"],
+                "confidence": row["confidence"],
+                "box": [row["box_x"], row["box_y"], row["box_w"], row["box_h"]],
+                "frame_dimensions": {"width": row["frame_width"], "height": row["frame_height"]}
+            }
+            for row in rows
+        ]
+        return detections, next_cursor
+
+    def get_stats(self):
+        """Get writer counters for status endpoints"""
+        return {
+            "running": self.is_running,
+            "path": str(self.path),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "messages_dropped": self.messages_dropped,
+            "rows_pruned": self.rows_pruned,
+            "queued": self._queue.qsize(),
+            "last_batch_ms": self.last_batch_ms
+        }
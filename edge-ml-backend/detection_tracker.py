@@ -0,0 +1,237 @@
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of two (N, 4) and (M, 4) arrays of [x, y, w, h] boxes, as an (N, M) array"""
+    ax0, ay0 = boxes_a[:, 0:1], boxes_a[:, 1:2]
+    ax1, ay1 = ax0 + boxes_a[:, 2:3], ay0 + boxes_a[:, 3:4]
+    bx0, by0 = boxes_b[:, 0], boxes_b[:, 1]
+    bx1, by1 = bx0 + boxes_b[:, 2], by0 + boxes_b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax1, bx1) - np.maximum(ax0, bx0), 0, None)
+    inter_h = np.clip(np.minimum(ay1, by1) - np.maximum(ay0, by0), 0, None)
+    intersection = inter_w * inter_h
+    union = (boxes_a[:, 2:3] * boxes_a[:, 3:4]) + (boxes_b[:, 2] * boxes_b[:, 3]) - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """Pairwise centroid distance of two box arrays, in units of the first box's diagonal"""
+    centers_a = boxes_a[:, :2] + boxes_a[:, 2:] / 2
+    centers_b = boxes_b[:, :2] + boxes_b[:, 2:] / 2
+    distance = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+    diagonal = np.maximum(np.linalg.norm(boxes_a[:, 2:], axis=1), 1.0)
+    return distance / diagonal[:, None]
+
+
+def greedy_match(scores, valid):
+    """(row, col) pairs taking the best-scoring valid pair first, each row and column used once"""
+    rows, cols = np.nonzero(valid)
+    order = np.argsort(-scores[rows, cols], kind="stable")
+    used_rows, used_cols = set(), set()
+    matches = []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row not in used_rows and col not in used_cols:
+            used_rows.add(row)
+            used_cols.add(col)
+            matches.append((row, col))
+    return matches
+
+
+class DetectionTracker:
+    """
+    Stable track ids for the Jetson's detections, plus boxes predicted at any
+    frame time. The Jetson infers at about 1 fps, so boxes would otherwise
+    jump once a second: each message is matched to the existing tracks by
+    IoU against the tracks' boxes extrapolated to the message's capture time,
+    falling back to centroid distance for fast movers whose boxes no longer
+    overlap. Two detections that both carry different person_ids are never
+    matched. Unmatched detections start new tracks; tracks unmatched for
+    max_age seconds are dropped.
+
+    boxes_at(t) interpolates between a track's last two observations when t
+    falls between them (delayed video) and extrapolates at the track's
+    velocity past the last one, for at most max_extrapolation seconds (live
+    video). All tracks are stored as NumPy arrays, so both matching and
+    prediction are a handful of vectorised operations per call.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_gate=2.0, max_age=3.0, max_extrapolation=1.5,
+                 min_speed=8.0):
+        self.iou_threshold = iou_threshold
+        self.centroid_gate = centroid_gate  # Max centroid distance, in box diagonals
+        self.max_age = max_age
+        self.max_extrapolation = max_extrapolation
+        self.min_speed = min_speed  # Pixels/second; slower movement is treated as detector jitter
+
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._clear_state()
+
+        # Counters
+        self.updates = 0
+        self.tracks_created = 0
+        self.matched_by_iou = 0
+        self.matched_by_centroid = 0
+        self.predictions = 0
+        self.total_update_seconds = 0.0
+
+    def _clear_state(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._box = np.zeros((0, 4))  # Last observed box
+        self._prev_box = np.zeros((0, 4))  # Observation before it
+        self._time = np.zeros(0)  # Capture time of the last observation
+        self._prev_time = np.zeros(0)
+        self._velocity = np.zeros((0, 4))  # Per box component, pixels/second
+        self._current = np.zeros(0, dtype=bool)  # Present in the latest message
+        self._detections = []  # Last observed detection dict per track
+
+    def _extrapolate(self, t):
+        """Every track's box at time t (interpolated, extrapolated or held), as an (N, 4) array"""
+        span = self._time - self._prev_time
+        fraction = np.clip((t - self._prev_time) / np.where(span > 0, span, 1.0), 0.0, 1.0)
+        interpolated = self._prev_box + (self._box - self._prev_box) * fraction[:, None]
+        ahead = np.clip(t - self._time, 0.0, self.max_extrapolation)
+        extrapolated = self._box + self._velocity * ahead[:, None]
+        return np.where((t > self._time)[:, None], extrapolated, interpolated)
+
+    def update(self, detections, timestamp=None):
+        """
+        Match a message's detections to the tracks and return copies of them
+        with a "track_id" added (in the message's order)
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        started = time.perf_counter()
+        boxes = np.array([self._box_of(detection) for detection in detections], dtype=float).reshape(-1, 4)
+
+        with self._lock:
+            self.updates += 1
+            count = len(self._ids)
+            matches = []
+            if count and len(detections):
+                predicted = self._extrapolate(timestamp)
+                compatible = self._compatible(detections)
+
+                ious = iou_matrix(predicted, boxes)
+                matches = greedy_match(ious, compatible & (ious >= self.iou_threshold))
+                self.matched_by_iou += len(matches)
+
+                # Fast movers: boxes no longer overlap, match remaining pairs by centroid distance
+                compatible[[row for row, _ in matches], :] = False
+                compatible[:, [col for _, col in matches]] = False
+                distances = centroid_distance_matrix(predicted, boxes)
+                by_centroid = greedy_match(-distances, compatible & (distances <= self.centroid_gate))
+                self.matched_by_centroid += len(by_centroid)
+                matches += by_centroid
+
+            track_of = {col: row for row, col in matches}
+            rows = np.array([track_of[col] for col in sorted(track_of)], dtype=np.int64)
+            cols = np.array(sorted(track_of), dtype=np.int64)
+            new_cols = np.array([col for col in range(len(detections)) if col not in track_of], dtype=np.int64)
+
+            # Matched tracks: shift the last observation back and estimate velocity
+            dt = timestamp - self._time[rows]
+            moving = dt > 0
+            velocity = self._velocity[rows].copy()
+            velocity[moving] = (boxes[cols][moving] - self._box[rows][moving]) / dt[moving, None]
+            velocity[np.abs(velocity) < self.min_speed] = 0.0
+            self._velocity[rows] = velocity
+            self._prev_box[rows[moving]] = self._box[rows[moving]]
+            self._prev_time[rows[moving]] = self._time[rows[moving]]
+            self._box[rows] = boxes[cols]
+            self._time[rows] = timestamp
+            self._current[:] = False
+            self._current[rows] = True
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                self._detections[row] = detections[col]
+
+            # Unmatched detections start new tracks
+            new_ids = np.arange(self._next_id, self._next_id + len(new_cols), dtype=np.int64)
+            self._next_id += len(new_cols)
+            self.tracks_created += len(new_cols)
+            self._ids = np.concatenate([self._ids, new_ids])
+            self._box = np.concatenate([self._box, boxes[new_cols]])
+            self._prev_box = np.concatenate([self._prev_box, boxes[new_cols]])
+            self._time = np.concatenate([self._time, np.full(len(new_cols), timestamp)])
+            self._prev_time = np.concatenate([self._prev_time, np.full(len(new_cols), timestamp)])
+            self._velocity = np.concatenate([self._velocity, np.zeros((len(new_cols), 4))])
+            self._current = np.concatenate([self._current, np.ones(len(new_cols), dtype=bool)])
+            self._detections += [detections[col] for col in new_cols.tolist()]
+
+            # Resolve ids before pruning: dropping tracks shifts the rows of the ones after them
+            ids = {col: int(self._ids[row]) for row, col in zip(rows.tolist(), cols.tolist())}
+            ids.update({col: int(track_id) for col, track_id in zip(new_cols.tolist(), new_ids.tolist())})
+
+            # Drop tracks nobody matched for max_age seconds
+            keep = self._current | (timestamp - self._time <= self.max_age)
+            if not keep.all():
+                self._select(keep)
+            self.total_update_seconds += time.perf_counter() - started
+
+        return [dict(detection, track_id=ids[index]) for index, detection in enumerate(detections)]
+
+    def boxes_at(self, timestamp):
+        """
+        Detections of the tracks in the latest message with their boxes moved
+        to where they were at timestamp (edge-clock capture time of a frame)
+        """
+        with self._lock:
+            if not len(self._ids):
+                return []
+            self.predictions += 1
+            # Delayed frames can predate a track's removal; show it until its last observation
+            visible = self._current | (timestamp <= self._time)
+            boxes = np.rint(self._extrapolate(timestamp)).astype(int)
+            return [
+                dict(self._detections[row], track_id=int(self._ids[row]), box=boxes[row].tolist())
+                for row in np.flatnonzero(visible).tolist()
+            ]
+
+    def _compatible(self, detections):
+        """(tracks, detections) mask: False where both carry a person_id and they differ"""
+        track_people = [detection.get("person_id") for detection in self._detections]
+        people = [detection.get("person_id") for detection in detections]
+        return np.array([[a is None or b is None or a == b for b in people] for a in track_people],
+                        dtype=bool).reshape(len(track_people), len(people))
+
+    @staticmethod
+    def _box_of(detection):
+        box = list(detection.get("box") or ())[:4]
+        return box + [0] * (4 - len(box))
+
+    def _select(self, keep):
+        self._ids = self._ids[keep]
+        self._box = self._box[keep]
+        self._prev_box = self._prev_box[keep]
+        self._time = self._time[keep]
+        self._prev_time = self._prev_time[keep]
+        self._velocity = self._velocity[keep]
+        self._current = self._current[keep]
+        self._detections = [d for d, k in zip(self._detections, keep.tolist()) if k]
+
+    def clear(self):
+        """Forget every track (the stream stopped); track ids keep increasing"""
+        with self._lock:
+            self._clear_state()
+
+    def get_stats(self):
+        """Get tracking counters for status endpoints"""
+        with self._lock:
+            tracks = len(self._ids)
+            visible = int(self._current.sum())
+        return {
+            "tracks": tracks,
+            "tracks_visible": visible,
+            "tracks_created": self.tracks_created,
+            "matched_by_iou": self.matched_by_iou,
+            "matched_by_centroid": self.matched_by_centroid,
+            "predictions": self.predictions,
+            "mean_update_us": round(self.total_update_seconds * 1e6 / max(1, self.updates), 1),
+            "max_extrapolation_s": self.max_extrapolation
+        }
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import NamedTuple, Optional, List
+
+import numpy as np
+
+
+class BufferedFrame(NamedTuple):
+    """A captured frame tagged with its sequence number and capture time"""
+    seq: int
+    frame: np.ndarray
+    timestamp: float
+
+
+class FrameRingBuffer:
+    """
+    Sequence-numbered ring of the most recent frames.
+    A single writer (the RTSP reader) puts frames in; any number of readers can
+    peek at them without removing anything, or block until a frame newer than
+    a sequence number they have already seen is available.
+
+    Readers asking for a frame newer than the latest one raise a demand flag,
+    which lets the writer skip decoding frames nobody is waiting for.
+    """
+
+    def __init__(self, capacity=5):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._slots: List[Optional[BufferedFrame]] = [None] * capacity
+        self._seq = 0
+        self._demand = False
+        self._condition = threading.Condition()
+
+    def put(self, frame, timestamp=None) -> int:
+        """Store a frame, overwriting the oldest slot, and wake waiting readers"""
+        with self._condition:
+            self._seq += 1
+            self._slots[self._seq % self.capacity] = BufferedFrame(
+                seq=self._seq,
+                frame=frame,
+                timestamp=timestamp if timestamp is not None else time.time()
+            )
+            self._demand = False
+            self._condition.notify_all()
+            return self._seq
+
+    def request_newer(self, seq):
+        """Signal that a reader wants a frame newer than seq"""
+        with self._condition:
+            if seq >= self._seq:
+                self._demand = True
+
+    def has_demand(self) -> bool:
+        """True if some reader is waiting for a frame newer than the latest one"""
+        with self._condition:
+            return self._demand
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest frame (0 if nothing was written yet)"""
+        with self._condition:
+            return self._seq
+
+    def latest(self) -> Optional[BufferedFrame]:
+        """Peek at the newest frame without consuming it"""
+        with self._condition:
+            return self._latest_locked()
+
+    def get(self, seq) -> Optional[BufferedFrame]:
+        """Return the frame with the given sequence number if it is still buffered"""
+        with self._condition:
+            entry = self._slots[seq % self.capacity]
+            if entry is not None and entry.seq == seq:
+                return entry
+            return None
+
+    def snapshot(self) -> List[BufferedFrame]:
+        """All buffered frames, oldest first"""
+        with self._condition:
+            return sorted((entry for entry in self._slots if entry is not None), key=lambda e: e.seq)
+
+    def intact(self, buffered) -> bool:
+        """Always True: buffered frames own their arrays, which are never overwritten"""
+        return True
+
+    def wait_for_newer(self, seq, timeout=None) -> Optional[BufferedFrame]:
+        """Block until a frame newer than seq exists and return the newest one, or None on timeout"""
+        with self._condition:
+            if seq >= self._seq:
+                self._demand = True
+            self._condition.wait_for(lambda: self._seq > seq, timeout=timeout)
+            if self._seq > seq:
+                return self._latest_locked()
+            return None
+
+    def clear(self):
+        """Drop all buffered frames (sequence numbers keep increasing)"""
+        with self._condition:
+            self._slots = [None] * self.capacity
+
+    def __len__(self):
+        with self._condition:
+            return sum(1 for entry in self._slots if entry is not None)
+
+    def _latest_locked(self) -> Optional[BufferedFrame]:
+        if self._seq == 0:
+            return None
+        return self._slots[self._seq % self.capacity]
@@ -0,0 +1,84 @@
+import threading
+import weakref
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FramePool:
+    """
+    Preallocated, reusable image buffers for capture, resize and overlay.
+    acquire() leases a pooled buffer as a new array; the lease ends when
+    that array and every view of it have been garbage collected (a weakref
+    finalizer on the leased array, which all of its views reference), and
+    only then does the buffer go back on the free list. Ownership is thus
+    explicit per lease, so reuse never overwrites pixels a buffered frame,
+    cached rendition or encoder still holds. A new buffer is only allocated
+    when every pooled buffer of that shape is leased; past max_per_shape
+    buffers, arrays are allocated unpooled.
+    """
+
+    def __init__(self, max_per_shape=40):
+        self.max_per_shape = max_per_shape
+        self._free = {}  # (shape, dtype) -> [bytearray]
+        self._counts = {}  # (shape, dtype) -> buffers created for the key
+        self._generation = 0  # Bumped by clear(); leases from before it are not returned
+        self._lock = threading.Lock()
+
+        # Counters: in steady state only `reused` should keep growing
+        self.allocated = 0
+        self.reused = 0
+        self.unpooled = 0
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        """Lease an array of this shape (contents are stale, not zeroed)"""
+        dtype = np.dtype(dtype)
+        key = (tuple(shape), dtype.str)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if free:
+                buffer = free.pop()
+                self.reused += 1
+            elif self._counts.get(key, 0) < self.max_per_shape:
+                buffer = bytearray(int(np.prod(shape)) * dtype.itemsize)
+                self._counts[key] = self._counts.get(key, 0) + 1
+                self.allocated += 1
+            else:
+                self.unpooled += 1
+                return np.empty(shape, dtype=dtype)
+            generation = self._generation
+
+        array = np.ndarray(shape, dtype=dtype, buffer=buffer)
+        weakref.finalize(array, self._return, key, buffer, generation)
+        return array
+
+    def _return(self, key, buffer, generation):
+        """End of a lease: the array and all its views are gone"""
+        with self._lock:
+            if generation == self._generation:
+                self._free.setdefault(key, []).append(buffer)
+
+    def clear(self):
+        """Drop every pooled buffer (e.g. after the stream resolution changes)"""
+        with self._lock:
+            self._free.clear()
+            self._counts.clear()
+            self._generation += 1
+
+    def get_stats(self):
+        """Get pool counters for status endpoints"""
+        with self._lock:
+            pooled = sum(self._counts.values())
+            free = sum(len(buffers) for buffers in self._free.values())
+            pooled_bytes = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize * count
+                               for (shape, dtype), count in self._counts.items())
+        return {
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "unpooled": self.unpooled,
+            "pooled_arrays": pooled,
+            "leased_arrays": pooled - free,
+            "pooled_bytes": pooled_bytes
+        }
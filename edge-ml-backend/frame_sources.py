@@ -0,0 +1,190 @@
+import cv2
+import time
+import logging
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSource(ABC):
+    """
+    Where the capture loops get frames from. open() returns a capture object
+    with the cv2.VideoCapture methods the loops use (isOpened, grab,
+    retrieve, release). Sources are plain picklable objects so they can be
+    handed to the decode worker process.
+    """
+
+    # Seconds the capture loop sleeps after each grab; sources that pace
+    # themselves inside grab() use 0 so they can run at full throughput
+    idle_sleep = 0.0
+
+    @abstractmethod
+    def open(self):
+        """Open a new capture object"""
+
+    @abstractmethod
+    def describe(self) -> str:
+        """Human-readable source description for status endpoints"""
+
+
+class RTSPSource(FrameSource):
+    """Live RTSP stream (the Jetson camera feed)"""
+
+    idle_sleep = 0.01  # Small sleep to prevent busy-waiting
+
+    def __init__(self, url):
+        self.url = url
+
+    def open(self):
+        cap = cv2.VideoCapture(self.url)
+        if cap.isOpened():
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer for lower latency
+        return cap
+
+    def describe(self):
+        return self.url
+
+
+class _PacedCapture:
+    """Spaces grab() calls 1/fps apart (fps 0 = as fast as possible)"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self._next_frame_at = None
+
+    def _pace(self):
+        if not self.fps:
+            time.sleep(0)  # Unthrottled: still let other threads take the GIL
+            return
+        now = time.monotonic()
+        if self._next_frame_at is None or now - self._next_frame_at > 1.0:
+            # First frame, or we fell far behind: restart the schedule
+            self._next_frame_at = now
+        elif self._next_frame_at > now:
+            time.sleep(self._next_frame_at - now)
+        self._next_frame_at += 1.0 / self.fps
+
+
+class VideoFileSource(FrameSource):
+    """Local video file, looped; played at fps, the file's native rate (None) or unthrottled (0)"""
+
+    def __init__(self, path, fps=None, loop=True):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+
+    def open(self):
+        return _VideoFileCapture(self.path, self.fps, self.loop)
+
+    def describe(self):
+        return f"file://{self.path}"
+
+
+class _VideoFileCapture(_PacedCapture):
+    def __init__(self, path, fps, loop):
+        self._cap = cv2.VideoCapture(path)
+        native_fps = self._cap.get(cv2.CAP_PROP_FPS) if self._cap.isOpened() else 0
+        super().__init__(fps if fps is not None else native_fps)
+        self.loop = loop
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def grab(self):
+        self._pace()
+        if self._cap.grab():
+            return True
+        if not self.loop:
+            return False
+        # End of file: rewind and carry on
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self._cap.grab()
+
+    def retrieve(self, image=None):
+        return self._cap.retrieve(image=image)
+
+    def release(self):
+        self._cap.release()
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames (moving box and frame counter over a gradient) at a given size and fps"""
+
+    def __init__(self, width=1280, height=720, fps=30.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+    def open(self):
+        return _SyntheticCapture(self.width, self.height, self.fps)
+
+    def describe(self):
+        return f"synthetic://{self.width}x{self.height}@{self.fps:g}"
+
+
+class _SyntheticCapture(_PacedCapture):
+    def __init__(self, width, height, fps):
+        super().__init__(fps)
+        gradient = np.linspace(0, 255, width, dtype=np.uint8)
+        self._background = np.empty((height, width, 3), dtype=np.uint8)
+        self._background[:] = gradient[None, :, None]
+        self._frame_number = 0
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        self._pace()
+        self._frame_number += 1
+        return self._opened
+
+    def retrieve(self, image=None):
+        height, width = self._background.shape[:2]
+        if image is None or image.shape != self._background.shape:
+            image = np.empty_like(self._background)
+        np.copyto(image, self._background)
+
+        # A box sweeping across the frame so change detection sees motion
+        box = max(8, height // 6)
+        x = (self._frame_number * 8) % max(1, width - box)
+        y = (height - box) // 2
+        image[y:y + box, x:x + box] = (0, 0, 255)
+        cv2.putText(image, str(self._frame_number), (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        return True, image
+
+    def release(self):
+        self._opened = False
+
+
+def make_frame_source(spec) -> FrameSource:
+    """
+    Build a frame source from a spec string:
+    rtsp://... (or any other URL OpenCV opens) -> RTSPSource
+    file:///path/video.mp4[?fps=10&loop=0]      -> VideoFileSource (native rate by default)
+    synthetic://1280x720[@30]                   -> SyntheticSource (fps 0 = unthrottled)
+    A FrameSource instance is returned unchanged.
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+
+    parsed = urlparse(spec)
+    if parsed.scheme == "file":
+        query = parse_qs(parsed.query)
+        fps = float(query["fps"][0]) if "fps" in query else None
+        loop = query.get("loop", ["1"])[0] not in ("0", "false")
+        return VideoFileSource(parsed.path, fps=fps, loop=loop)
+
+    if parsed.scheme == "synthetic":
+        size, _, fps = parsed.netloc.partition("@")
+        width, _, height = size.partition("x")
+        return SyntheticSource(
+            width=int(width) if width else 1280,
+            height=int(height) if height else 720,
+            fps=float(fps) if fps else 30.0
+        )
+
+    return RTSPSource(spec)
@@ -0,0 +1,287 @@
+import collections
+import cv2
+import functools
+import os
+import re
+import tempfile
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_NAME = re.compile(r"^segment_(\d+)\.ts$")
+H264_FOURCCS = ("avc1", "H264")
+
+
+@functools.lru_cache(maxsize=None)
+def probe_fourcc(fourccs, fps=10.0) -> Optional[str]:
+    """First fourcc the local OpenCV/FFmpeg build can open an MPEG-TS writer with, or None"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "probe.ts")
+        for fourcc in fourccs:
+            writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*fourcc), fps, (64, 64))
+            opened = writer.isOpened()
+            writer.release()
+            if opened:
+                return fourcc
+    return None
+
+
+class HLSSegment(NamedTuple):
+    sequence: int
+    duration: float
+    size: int
+
+
+class HLSSegmenter:
+    """
+    Short MPEG-TS video segments plus a sliding-window HLS playlist, written
+    with OpenCV's VideoWriter from the stream client's frames. Inter-frame
+    coding makes this far cheaper on the wire than MJPEG, at the cost of a
+    few segments of latency.
+
+    Segments are only produced while someone is watching: every playlist or
+    segment request calls touch(), the writer starts on the first one and
+    stops after idle_timeout seconds without requests. The first fourcc in
+    fourccs that the local OpenCV/FFmpeg build can open is used. Browsers
+    only play H.264, so fourccs lists H.264 tags only; when the OpenCV build
+    has no H.264 encoder (the pip wheels don't) the segmenter never starts
+    and unavailable_reason says why.
+
+    Each segment comes from its own VideoWriter, so its timestamps restart
+    at zero; the playlist marks every boundary with EXT-X-DISCONTINUITY so
+    players reset their timeline instead of stalling or jumping.
+    """
+
+    def __init__(self, stream_client, directory="hls", segment_seconds=2.0, playlist_size=5, fps=10.0,
+                 width=800, draw_overlay=True, fourccs=H264_FOURCCS, idle_timeout=30.0):
+        self.stream_client = stream_client
+        self.directory = Path(directory)
+        self.segment_seconds = segment_seconds
+        self.playlist_size = playlist_size
+        self.fps = fps
+        self.width = width
+        self.draw_overlay = draw_overlay
+        self.fourccs = fourccs
+        self.idle_timeout = idle_timeout
+
+        self._segments = collections.deque(maxlen=playlist_size)
+        self._lock = threading.Lock()
+        self._next_sequence = 0
+        self._last_request = 0.0
+        self.fourcc = None  # Fourcc actually in use, once a writer opened
+        self.unavailable_reason = None
+        if probe_fourcc(tuple(fourccs), fps) is None:
+            self.unavailable_reason = self._no_codec_reason()
+
+        # Control variables
+        self._stop_event = None
+        self._thread = None
+
+        # Counters
+        self.segments_written = 0
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.frames_repeated = 0
+
+    # ---- lifecycle ----
+
+    @property
+    def is_running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def touch(self):
+        """Note a viewer request, starting the segment writer if it is idle"""
+        self._last_request = time.monotonic()
+        with self._lock:
+            if self.is_running or self.unavailable_reason:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._remove_segment_files()
+            self._segments.clear()
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._segment_loop, args=(self._stop_event,), daemon=True)
+            self._thread.start()
+        logger.info(f"HLS segmenter started in {self.directory}")
+
+    def stop(self):
+        """Stop writing segments (the current partial segment is discarded)"""
+        with self._lock:
+            if not self.is_running:
+                return
+            self._stop_event.set()
+            thread = self._thread
+        thread.join(timeout=2)
+        logger.info("HLS segmenter stopped")
+
+    # ---- serving ----
+
+    def get_playlist(self) -> Optional[str]:
+        """Live media playlist of the newest segments, or None until the first one is written"""
+        with self._lock:
+            segments = list(self._segments)
+        if not segments:
+            return None
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{int(max(s.duration for s in segments) + 0.999)}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].sequence}",
+            # Every segment after segment 0 starts a new discontinuity
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{segments[0].sequence}"
+        ]
+        for index, segment in enumerate(segments):
+            if index:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{segment.duration:.3f},")
+            lines.append(f"segment_{segment.sequence}.ts")
+        return "\n".join(lines) + "\n"
+
+    def segment_path(self, name) -> Optional[Path]:
+        """Path of a finished segment listed in (or just dropped from) the playlist, else None"""
+        match = SEGMENT_NAME.match(name)
+        if match is None:
+            return None
+        path = self.directory / name
+        return path if path.exists() else None
+
+    # ---- writer ----
+
+    def _open_writer(self, path, frame_size):
+        for fourcc in ([self.fourcc] if self.fourcc else self.fourccs):
+            writer = cv2.VideoWriter(str(path), cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*fourcc), self.fps,
+                                     frame_size)
+            if writer.isOpened():
+                if self.fourcc != fourcc:
+                    logger.info(f"HLS segments encoded as {fourcc}")
+                self.fourcc = fourcc
+                return writer
+            writer.release()
+        self.unavailable_reason = self._no_codec_reason()
+        raise RuntimeError(self.unavailable_reason)
+
+    def _no_codec_reason(self):
+        return f"No H.264 VideoWriter codec among {list(self.fourccs)} in this OpenCV build"
+
+    def _render(self, buffered):
+        detections = self.stream_client.get_frame_detections(buffered) if self.draw_overlay else []
+        return self.stream_client.render_buffered_frame(buffered, display_width=self.width or buffered.frame.shape[1],
+                                                        detections=detections)
+
+    def _segment_loop(self, stop_event):
+        """Write frames at a constant fps, cutting a new segment every segment_seconds"""
+        interval = 1.0 / self.fps
+        frames_per_segment = max(1, int(round(self.segment_seconds * self.fps)))
+        last_seq = 0
+        image = None
+        writer = None
+        partial_path = None
+        frames_in_segment = 0
+        next_frame_at = time.monotonic()
+
+        try:
+            while not stop_event.is_set():
+                if time.monotonic() - self._last_request > self.idle_timeout:
+                    logger.info("No HLS viewers, stopping segmenter")
+                    break
+
+                try:
+                    buffered = self.stream_client.wait_for_frame(after_seq=last_seq, timeout=interval)
+                    rendered = self._render(buffered) if buffered is not None else None
+                    if rendered is not None:
+                        last_seq = buffered.seq
+                        image = rendered
+                    elif image is not None:
+                        # Constant frame rate: hold the last frame while the camera is quiet
+                        self.frames_repeated += 1
+                    else:
+                        continue
+
+                    if writer is not None and (image.shape[1], image.shape[0]) != frame_size:
+                        # Resolution changed: close the segment early
+                        writer.release()
+                        writer = None
+                        self._finish_segment(partial_path, frames_in_segment)
+                    if writer is None:
+                        frame_size = (image.shape[1], image.shape[0])
+                        partial_path = self.directory / f"partial_{self._next_sequence}.ts"
+                        writer = self._open_writer(partial_path, frame_size)
+                        frames_in_segment = 0
+
+                    writer.write(image)
+                    frames_in_segment += 1
+                    self.frames_written += 1
+                    if frames_in_segment >= frames_per_segment:
+                        writer.release()
+                        writer = None
+                        self._finish_segment(partial_path, frames_in_segment)
+                except Exception as e:
+                    logger.error(f"Error in HLS segment loop: {e}")
+                    if writer is not None:
+                        writer.release()
+                        writer = None
+                    if self.unavailable_reason:
+                        break
+                    stop_event.wait(1.0)
+
+                next_frame_at += interval
+                delay = next_frame_at - time.monotonic()
+                if delay > 0:
+                    stop_event.wait(delay)
+                else:
+                    next_frame_at = time.monotonic()  # Fell behind: don't burst to catch up
+        finally:
+            if writer is not None:
+                writer.release()
+            with self._lock:
+                stop_event.set()
+
+    def _finish_segment(self, partial_path, frame_count):
+        """Publish a completed segment and drop the ones that fell out of the playlist window"""
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        path = self.directory / f"segment_{sequence}.ts"
+        os.replace(partial_path, path)
+        size = path.stat().st_size
+
+        with self._lock:
+            self._segments.append(HLSSegment(sequence=sequence, duration=frame_count / self.fps, size=size))
+            oldest = self._segments[0].sequence
+        self.segments_written += 1
+        self.bytes_written += size
+
+        # Keep one segment behind the window for players still fetching it
+        stale = self.directory / f"segment_{oldest - 2}.ts"
+        if stale.exists():
+            stale.unlink()
+
+    def _remove_segment_files(self):
+        for path in list(self.directory.glob("segment_*.ts")) + list(self.directory.glob("partial_*.ts")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get_stats(self):
+        """Get segmenter counters for status endpoints"""
+        with self._lock:
+            segments = list(self._segments)
+        return {
+            "running": self.is_running,
+            "fourcc": self.fourcc,
+            "unavailable_reason": self.unavailable_reason,
+            "fps": self.fps,
+            "width": self.width,
+            "segment_seconds": self.segment_seconds,
+            "segments_in_playlist": len(segments),
+            "segments_written": self.segments_written,
+            "frames_written": self.frames_written,
+            "frames_repeated": self.frames_repeated,
+            "bytes_written": self.bytes_written,
+            "bitrate_kbps": (round(sum(s.size for s in segments) * 8 / sum(s.duration for s in segments) / 1000, 1)
+                             if segments else None)
+        }
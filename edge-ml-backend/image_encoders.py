@@ -0,0 +1,155 @@
+import argparse
+import cv2
+import statistics
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+except ImportError:  # Optional: pip install PyTurboJPEG (needs libjpeg-turbo)
+    TurboJPEG = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImageEncoder(ABC):
+    """Encodes BGR frames to bytes for streaming; quality is 1-100 where it applies"""
+    name = None
+    content_type = None
+
+    @abstractmethod
+    def encode(self, image, quality) -> Optional[bytes]:
+        """Encoded image bytes, or None if encoding failed"""
+
+
+class OpenCVJPEGEncoder(ImageEncoder):
+    name = "jpeg"
+    content_type = "image/jpeg"
+
+    def encode(self, image, quality):
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ret else None
+
+
+class TurboJPEGEncoder(ImageEncoder):
+    """JPEG through a direct libjpeg-turbo binding (PyTurboJPEG), if installed"""
+    name = "turbojpeg"
+    content_type = "image/jpeg"
+
+    def __init__(self):
+        if TurboJPEG is None:
+            raise RuntimeError("PyTurboJPEG is not installed")
+        self._turbo = TurboJPEG()
+
+    def encode(self, image, quality):
+        return self._turbo.encode(np.ascontiguousarray(image), quality=quality, pixel_format=TJPF_BGR)
+
+
+class WebPEncoder(ImageEncoder):
+    name = "webp"
+    content_type = "image/webp"
+
+    def encode(self, image, quality):
+        ret, buffer = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        return buffer.tobytes() if ret else None
+
+
+class PNGEncoder(ImageEncoder):
+    """Lossless; quality is ignored and a fast compression level is used"""
+    name = "png"
+    content_type = "image/png"
+    compression = 1  # 0-9: higher is smaller but much slower
+
+    def encode(self, image, quality):
+        ret, buffer = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+        return buffer.tobytes() if ret else None
+
+
+ENCODER_CLASSES = {cls.name: cls for cls in (OpenCVJPEGEncoder, TurboJPEGEncoder, WebPEncoder, PNGEncoder)}
+_encoders = {}
+
+
+def available_encoders():
+    """Names of the encoders usable in this environment"""
+    return [name for name in ENCODER_CLASSES if name != "turbojpeg" or TurboJPEG is not None]
+
+
+def get_encoder(name) -> ImageEncoder:
+    """Shared encoder instance by name (ValueError if unknown or not installed)"""
+    encoder = _encoders.get(name)
+    if encoder is None:
+        if name not in available_encoders():
+            raise ValueError(f"Unknown or unavailable encoder '{name}', expected one of {available_encoders()}")
+        encoder = _encoders[name] = ENCODER_CLASSES[name]()
+    return encoder
+
+
+def benchmark(frames, quality=85, encoders=None, fps=10.0):
+    """Encode every frame with each encoder; return per-encoder timing and size summaries"""
+    results = []
+    for name in encoders or available_encoders():
+        encoder = get_encoder(name)
+        encoder.encode(frames[0], quality)  # Warm-up
+
+        times = []
+        sizes = []
+        for frame in frames:
+            started = time.perf_counter()
+            data = encoder.encode(frame, quality)
+            times.append(time.perf_counter() - started)
+            sizes.append(len(data))
+
+        mean_bytes = statistics.mean(sizes)
+        results.append({
+            "encoder": name,
+            "mean_ms": round(statistics.mean(times) * 1000, 2),
+            "p95_ms": round(sorted(times)[int(0.95 * (len(times) - 1))] * 1000, 2),
+            "mean_bytes": int(mean_bytes),
+            "max_fps": round(1.0 / statistics.mean(times), 1),
+            "mbps_at_fps": round(mean_bytes * 8 * fps / 1e6, 2)
+        })
+    return results
+
+
+def main():
+    """Encoder micro-benchmark: python image_encoders.py --source file:///clip.mp4 --width 1280"""
+    from frame_sources import make_frame_source
+
+    parser = argparse.ArgumentParser(description="Compare stream encoders on representative frames")
+    parser.add_argument("--source", default="synthetic://1280x720@0",
+                        help="Frame source spec (rtsp://..., file:///clip.mp4, synthetic://WxH)")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--width", type=int, default=None, help="Resize frames to this width first")
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--fps", type=float, default=10.0, help="Frame rate used for the bandwidth column")
+    parser.add_argument("--encoders", nargs="*", default=None, help=f"Subset of {list(ENCODER_CLASSES)}")
+    args = parser.parse_args()
+
+    cap = make_frame_source(args.source).open()
+    frames = []
+    while len(frames) < args.frames and cap.grab():
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        if args.width and frame.shape[1] != args.width:
+            height = int(frame.shape[0] * args.width / frame.shape[1])
+            frame = cv2.resize(frame, (args.width, height), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        parser.error(f"No frames read from {args.source}")
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames {width}x{height}, quality {args.quality}, bandwidth at {args.fps:g} fps")
+    print(f"{'encoder':<10} {'mean ms':>8} {'p95 ms':>8} {'bytes':>9} {'max fps':>8} {'Mbit/s':>7}")
+    for row in benchmark(frames, args.quality, args.encoders, args.fps):
+        print(f"{row['encoder']:<10} {row['mean_ms']:>8} {row['p95_ms']:>8} {row['mean_bytes']:>9} "
+              f"{row['max_fps']:>8} {row['mbps_at_fps']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import bisect
+import cv2
+import heapq
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import NamedTuple, List
+
+logger = logging.getLogger(__name__)
+
+RECORD_FRAME = 1
+RECORD_DETECTIONS = 2
+
+# Segment record header: type (u8), timestamp (f64), payload length (u32)
+RECORD_HEADER = struct.Struct("<BdI")
+# Index entry: timestamp (f64), byte offset of the record in the segment (u64)
+INDEX_ENTRY = struct.Struct("<dQ")
+
+
+class Record(NamedTuple):
+    """One frame (JPEG bytes) or detection message (JSON bytes) read back from disk"""
+    kind: int
+    timestamp: float
+    payload: bytes
+
+
+class Segment:
+    """In-memory view of one segment file and its timestamp index"""
+
+    def __init__(self, segment_id, data_path, index_path):
+        self.segment_id = segment_id
+        self.data_path = data_path
+        self.index_path = index_path
+        self.timestamps: List[float] = []
+        self.offsets: List[int] = []
+        self.size = 0
+
+    @property
+    def start_ts(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    @property
+    def end_ts(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def load_index(self):
+        """Read the sidecar index written alongside the segment"""
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for timestamp, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+        self.size = os.path.getsize(self.data_path)
+
+
+class IncidentRecorder:
+    """
+    Rolling on-disk recorder of encoded frames and detection messages.
+    Records are appended by one background writer thread to fixed-size
+    segment files, each with a sidecar (timestamp, offset) index; once more
+    than max_segments exist the oldest is deleted, bounding disk usage to
+    about segment_size * max_segments. Time-range reads only open the
+    segments overlapping the range and bisect their index to the start.
+
+    Detections are recorded at their capture time, which is earlier than
+    frames grabbed while the Jetson was still inferring. The writer holds
+    records for reorder_window seconds and writes them in timestamp order,
+    so the index stays sorted and replayed boxes line up with their frames;
+    a record arriving later than that is dropped and counted.
+    """
+
+    def __init__(self, stream_client, directory="recordings", segment_size=16 * 1024 * 1024, max_segments=32,
+                 record_fps=5.0, record_width=None, jpeg_quality=75, queue_size=64, reorder_window=3.0):
+        self.stream_client = stream_client
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.record_fps = record_fps
+        self.record_width = record_width  # None keeps the native resolution
+        self.jpeg_quality = jpeg_quality
+        self.reorder_window = reorder_window  # Seconds records wait so late detections can be put in order
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._segments: List[Segment] = []
+        self._segments_lock = threading.Lock()
+        self._data_file = None
+        self._index_file = None
+
+        # Control variables
+        self._stop_event = None
+        self._writer_thread = None
+        self._capture_thread = None
+
+        # Counters
+        self.frames_recorded = 0
+        self.detections_recorded = 0
+        self.records_dropped = 0
+        self.records_late = 0
+        self.segments_deleted = 0
+        self._pending_count = 0
+
+        if self.directory.exists():
+            self._load_segments()
+
+    # ---- lifecycle ----
+
+    @property
+    def is_running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def start(self):
+        """Start the capture and writer threads (existing segments are loaded on construction)"""
+        if self.is_running:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._stop_event = threading.Event()
+        self._writer_thread = threading.Thread(target=self._writer_loop, args=(self._stop_event,), daemon=True)
+        self._capture_thread = threading.Thread(target=self._capture_loop, args=(self._stop_event,), daemon=True)
+        self._writer_thread.start()
+        self._capture_thread.start()
+        logger.info(f"Incident recorder started in {self.directory}")
+
+    def stop(self):
+        """Stop recording and close the current segment"""
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._capture_thread.join(timeout=2)
+        self._writer_thread.join(timeout=2)
+        logger.info("Incident recorder stopped")
+
+    def _load_segments(self):
+        with self._segments_lock:
+            self._segments = []
+            for index_path in sorted(self.directory.glob("segment_*.idx")):
+                data_path = index_path.with_suffix(".bin")
+                if not data_path.exists():
+                    continue
+                segment = Segment(int(index_path.stem.split("_")[1]), data_path, index_path)
+                try:
+                    segment.load_index()
+                except OSError as e:
+                    logger.warning(f"Skipping unreadable segment {data_path}: {e}")
+                    continue
+                self._segments.append(segment)
+
+    # ---- producers ----
+
+    def record_detections(self, results, timestamp=None):
+        """Queue a detection message for recording (never blocks the caller)"""
+        payload = json.dumps(results).encode()
+        self._enqueue(RECORD_DETECTIONS, timestamp if timestamp is not None else time.time(), payload)
+
+    def _enqueue(self, kind, timestamp, payload):
+        if not self.is_running:
+            return
+        try:
+            self._queue.put_nowait((kind, timestamp, payload))
+        except queue.Full:
+            self.records_dropped += 1
+
+    def _capture_loop(self, stop_event):
+        """Encode frames from the stream client at record_fps"""
+        interval = 1.0 / self.record_fps if self.record_fps > 0 else 0
+        last_seq = 0
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                buffered = self.stream_client.wait_for_frame(after_seq=last_seq, timeout=1.0)
+                if buffered is not None:
+                    last_seq = buffered.seq
+                    frame = buffered.frame
+                    if self.record_width and frame.shape[1] > self.record_width:
+                        height = int(frame.shape[0] * (self.record_width / frame.shape[1]))
+                        scaled = self.stream_client.frame_pool.acquire((height, self.record_width) + frame.shape[2:])
+                        frame = cv2.resize(frame, (self.record_width, height), dst=scaled,
+                                           interpolation=cv2.INTER_AREA)
+                    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    # Skip frames overwritten in the shared ring while being encoded
+                    if ret and self.stream_client.frame_intact(buffered):
+                        self._enqueue(RECORD_FRAME, buffered.timestamp, buffer.tobytes())
+            except Exception as e:
+                logger.error(f"Error in recorder capture loop: {e}")
+                stop_event.wait(1.0)
+
+            elapsed = time.monotonic() - started
+            if interval > elapsed:
+                stop_event.wait(interval - elapsed)
+
+    # ---- writer ----
+
+    def _writer_loop(self, stop_event):
+        pending = []  # Heap of (timestamp, arrival order, kind, payload)
+        arrival = itertools.count()
+        last_written = float("-inf")
+        try:
+            while not stop_event.is_set() or not self._queue.empty() or pending:
+                try:
+                    kind, timestamp, payload = self._queue.get(timeout=0.1)
+                    heapq.heappush(pending, (timestamp, next(arrival), kind, payload))
+                except queue.Empty:
+                    pass
+
+                # Write whatever is older than the reorder window (everything once stopped and drained)
+                flush = stop_event.is_set() and self._queue.empty()
+                horizon = time.time() - self.reorder_window
+                while pending and (flush or pending[0][0] <= horizon):
+                    timestamp, _, kind, payload = heapq.heappop(pending)
+                    if timestamp < last_written:
+                        # Too late to keep the index sorted
+                        self.records_late += 1
+                        continue
+                    try:
+                        self._write_record(kind, timestamp, payload)
+                        last_written = timestamp
+                    except OSError as e:
+                        logger.error(f"Error writing incident record: {e}")
+                self._pending_count = len(pending)
+        finally:
+            self._pending_count = 0
+            self._close_segment()
+
+    def _open_segment(self):
+        with self._segments_lock:
+            next_id = self._segments[-1].segment_id + 1 if self._segments else 0
+        data_path = self.directory / f"segment_{next_id:08d}.bin"
+        index_path = self.directory / f"segment_{next_id:08d}.idx"
+        segment = Segment(next_id, data_path, index_path)
+        self._data_file = open(data_path, "wb")
+        self._index_file = open(index_path, "wb")
+
+        with self._segments_lock:
+            self._segments.append(segment)
+            expired = self._segments[:-self.max_segments] if len(self._segments) > self.max_segments else []
+            self._segments = self._segments[len(expired):]
+
+        # Ring: drop the oldest segments once the budget is exceeded
+        for old in expired:
+            for path in (old.data_path, old.index_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self.segments_deleted += 1
+        return segment
+
+    def _close_segment(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = None
+        self._index_file = None
+
+    def _write_record(self, kind, timestamp, payload):
+        with self._segments_lock:
+            segment = self._segments[-1] if self._segments and self._data_file is not None else None
+        if segment is None or segment.size >= self.segment_size:
+            self._close_segment()
+            segment = self._open_segment()
+
+        offset = segment.size
+        self._data_file.write(RECORD_HEADER.pack(kind, timestamp, len(payload)))
+        self._data_file.write(payload)
+        self._data_file.flush()
+        self._index_file.write(INDEX_ENTRY.pack(timestamp, offset))
+        self._index_file.flush()
+
+        # Publish the index entry only after the record is on disk
+        with self._segments_lock:
+            segment.timestamps.append(timestamp)
+            segment.offsets.append(offset)
+            segment.size = offset + RECORD_HEADER.size + len(payload)
+
+        if kind == RECORD_FRAME:
+            self.frames_recorded += 1
+        else:
+            self.detections_recorded += 1
+
+    # ---- readers ----
+
+    def iter_records(self, from_ts, to_ts, kinds=(RECORD_FRAME, RECORD_DETECTIONS)):
+        """Yield Records with from_ts <= timestamp <= to_ts in time order"""
+        with self._segments_lock:
+            # Snapshot just the overlapping segments and their index lengths
+            selected = [
+                (segment, len(segment.timestamps))
+                for segment in self._segments
+                if segment.timestamps and segment.end_ts >= from_ts and segment.start_ts <= to_ts
+            ]
+
+        for segment, count in selected:
+            start = bisect.bisect_left(segment.timestamps, from_ts, 0, count)
+            if start >= count:
+                continue
+            try:
+                with open(segment.data_path, "rb") as f:
+                    f.seek(segment.offsets[start])
+                    for _ in range(start, count):
+                        header = f.read(RECORD_HEADER.size)
+                        if len(header) < RECORD_HEADER.size:
+                            break
+                        kind, timestamp, length = RECORD_HEADER.unpack(header)
+                        if timestamp > to_ts:
+                            break
+                        if kind in kinds:
+                            yield Record(kind, timestamp, f.read(length))
+                        else:
+                            f.seek(length, os.SEEK_CUR)
+            except FileNotFoundError:
+                # Segment rotated out while we were reading
+                continue
+
+    def get_detections(self, from_ts, to_ts) -> List[dict]:
+        """Recorded detection messages in a time range"""
+        return [
+            {"timestamp": record.timestamp, "message": json.loads(record.payload)}
+            for record in self.iter_records(from_ts, to_ts, kinds=(RECORD_DETECTIONS,))
+        ]
+
+    def get_stats(self):
+        """Get recorder counters for status endpoints"""
+        with self._segments_lock:
+            segments = list(self._segments)
+        return {
+            "running": self.is_running,
+            "directory": str(self.directory),
+            "segments": len(segments),
+            "max_segments": self.max_segments,
+            "segment_size": self.segment_size,
+            "bytes_on_disk": sum(segment.size for segment in segments),
+            "oldest_timestamp": segments[0].start_ts if segments else None,
+            "newest_timestamp": segments[-1].end_ts if segments else None,
+            "frames_recorded": self.frames_recorded,
+            "detections_recorded": self.detections_recorded,
+            "records_dropped": self.records_dropped,
+            "records_late": self.records_late,
+            "records_pending": self._pending_count,
+            "reorder_window": self.reorder_window,
+            "segments_deleted": self.segments_deleted,
+            "queue_size": self._queue.qsize()
+        }
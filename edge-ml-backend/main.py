@@ -14,14 +14,25 @@ from pathlib import Path
 import base64
 import cv2
 import json as json_lib
-from mqtt_stream_client import RTSPMQTTStreamClient
+from camera_registry import CameraRegistry, CameraConfig
+from stream_broadcaster import MJPEGBroadcaster, ViewerProfile, SnapshotCache, build_mjpeg_part
+from adaptive_stream import AdaptiveRateController, DEFAULT_STREAM_LEVELS
+from change_detection import FrameChangeDetector, detections_tag
+from incident_recorder import IncidentRecorder, RECORD_FRAME
+from image_encoders import available_encoders, get_encoder
+from detection_crops import DetectionCropCache
+from hls_segmenter import HLSSegmenter, probe_fourcc
+from detection_hub import DetectionHub
+from detection_delta import DetectionDeltaEncoder
+from wire_formats import available_formats, get_format
+from detection_store import DetectionStore
 import numpy as np
 import time
-import queue
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from starlette.websockets import WebSocketState
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -56,16 +67,111 @@ JUPYTERHUB_USER = "akumar"  # Your specific user
 JETSON_IP = "192.168.2.100"
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
-websocket_message_queue = queue.Queue()
+
+# Cameras served by this backend. /api/cameras/{camera_id}/... selects one;
+# the original /api/stream/... endpoints serve STREAM_DEFAULT_CAMERA
+STREAM_CAMERAS = [
+    CameraConfig(
+        camera_id="default",
+        rtsp_url="rtsp://192.168.2.100:8554/test",
+        mqtt_topic="jetson/face_recognition/results",
+        max_decode_fps=15.0,
+        decode_worker_process=False,  # True moves RTSP capture/decode off the API process
+        source=None  # e.g. "file:///data/drill.mp4?fps=15" or "synthetic://1280x720@30" for load tests
+    ),
+]
+STREAM_DEFAULT_CAMERA = STREAM_CAMERAS[0].camera_id
+STREAM_MAX_CONCURRENT_DECODES = 2  # Decode slots shared by all cameras
+
+# MJPEG stream settings (shared by all viewers)
+STREAM_DISPLAY_WIDTH = 800
+STREAM_JPEG_QUALITY = 85
+# Default image encoder; viewers may pick another with ?encoder= (jpeg, turbojpeg if
+# installed, webp, png). Compare them with: python image_encoders.py --source <spec>
+STREAM_ENCODER = "jpeg"
+STREAM_MAX_SESSIONS = 10  # Concurrent video sessions per camera
+
+# Per-viewer adaptive bounds: viewers move along this ladder based on backpressure
+STREAM_LEVELS = DEFAULT_STREAM_LEVELS
+STREAM_START_LEVEL = 3  # 3 fps, quality 85, 800 px
+STREAM_TARGET_FPS = max(level.fps for level in STREAM_LEVELS)
+
+# Renditions selectable with ?rendition=; width None means full camera resolution.
+# Adaptive viewers scale their rendition by level.width / STREAM_DISPLAY_WIDTH.
+STREAM_RENDITIONS = {
+    "thumb": 320,
+    "operator": STREAM_DISPLAY_WIDTH,
+    "full": None,
+}
+STREAM_DEFAULT_RENDITION = "operator"
+
+# Static-scene suppression: frames whose downsampled mean abs difference is below
+# the threshold (0-255) with unchanged detections reuse the previous encoded frame
+STREAM_CHANGE_THRESHOLD = 2.0
+STREAM_MAX_STATIC_SECONDS = 10.0
+STREAM_KEEPALIVE_SECONDS = 5.0  # Re-send the last frame to idle viewers at this interval
+DETECTIONS_WS_QUEUE_SIZE = 64  # Per-client backlog; a slow client loses its oldest messages
+DETECTIONS_WS_STATUS_INTERVAL = 1.0  # Seconds between status messages on /api/stream/detections
+# Delta mode (the default): only adds, removes and box moves above this many pixels are
+# sent, keyed by person_id, with a full snapshot on connect and every resync interval
+DETECTIONS_DELTA_MOVE_THRESHOLD = 4.0
+DETECTIONS_DELTA_RESYNC_SECONDS = 10.0
+DETECTIONS_TOPIC_FULL = "detections"
+DETECTIONS_TOPIC_DELTA = "detections_delta"
+SNAPSHOT_MAX_AGE = 1.0  # /api/stream/snapshot serves the cached frame while it is younger than this
+CROP_JPEG_QUALITY = 90
+CROP_PADDING = 0.2  # Margin added around each person's box, as a fraction of the box size
+
+# ?sync=live shows the newest frame with the latest boxes; ?sync=delayed holds video
+# back by the measured MQTT latency so boxes are drawn on the frame they came from
+STREAM_SYNC_MODES = ("live", "delayed")
+
+# Incident recorder: the last RECORDER_SEGMENT_SIZE * RECORDER_MAX_SEGMENTS bytes of
+# frames and detections are kept on disk per camera (512 MB is roughly 15-20 minutes at 5 fps)
+RECORDER_ENABLED = True
+RECORDER_DIR = Path("recordings")  # One subdirectory per camera id
+RECORDER_SEGMENT_SIZE = 16 * 1024 * 1024
+RECORDER_MAX_SEGMENTS = 32
+RECORDER_FPS = 5.0
+RECORDER_JPEG_QUALITY = 75
+RECORDER_REORDER_WINDOW = 3.0  # Seconds to wait for late detections before writing records in time order
+REPLAY_MAX_SPEED = 16.0
+REPLAY_MAX_GAP_SECONDS = 2.0  # Longer recording gaps are shortened during replay
+
+# Detection history (/api/detections/history): every detection of every camera in SQLite
+HISTORY_ENABLED = True
+HISTORY_DB_PATH = Path("detections.db")
+HISTORY_BATCH_SIZE = 500  # MQTT messages per write transaction
+HISTORY_RETENTION_DAYS = 30  # None keeps everything
+HISTORY_MAX_PAGE_SIZE = 1000
+
+# HLS output (/api/stream/hls/index.m3u8): short VideoWriter segments for viewers that
+# accept a few seconds of latency in exchange for much less bandwidth than MJPEG.
+# Segments are only written while the playlist is being polled.
+HLS_ENABLED = True
+HLS_DIR = Path("hls")  # One subdirectory per camera id
+HLS_SEGMENT_SECONDS = 2.0
+HLS_PLAYLIST_SIZE = 5
+HLS_FPS = 10.0
+HLS_WIDTH = STREAM_DISPLAY_WIDTH
+HLS_FOURCCS = ("avc1", "H264")  # First one the OpenCV build can encode is used; H.264 only, browsers play nothing else
+HLS_IDLE_TIMEOUT = 30.0
 
 # Global variables for tracking operations
 training_status = {}
 deployment_status = {}
 jupyterhub_token = None
 
-# Stream client global variables
-stream_client = None
-active_websockets = []
+# Stream client global variables, keyed by camera id
+camera_registry = None
+stream_broadcasters = {}  # (camera id, sync mode, draw overlay) -> MJPEGBroadcaster
+incident_recorders = {}
+snapshot_caches = {}
+crop_caches = {}
+hls_segmenters = {}
+detection_store = None
+detection_hubs = {}  # camera id -> DetectionHub feeding /api/stream/detections clients
+detection_deltas = {}  # camera id -> DetectionDeltaEncoder shared by delta-mode clients
 
 # Pydantic models
 class JupyterHubTokenRequest(BaseModel):
@@ -78,6 +184,11 @@ class TrainingRequest(BaseModel):
 class DeploymentRequest(BaseModel):
     model_type: str = "rf"
 
+class NotebookExecutionRequest(BaseModel):
+    object_name: str
+    notebook_path: str = "face_recognition_system/edge_server/edge_train.ipynb"
+    timeout: int = 600
+
 class StatusResponse(BaseModel):
     status: str
     message: str
@@ -85,82 +196,339 @@ class StatusResponse(BaseModel):
     details: Optional[dict] = None
 
 # Stream client initialization
-def initialize_stream_client():
-    """Initialize the MQTT/RTSP stream client with queue-based messaging"""
-    global stream_client
-    if stream_client is None:
-        stream_client = RTSPMQTTStreamClient()
-
-        def on_detection_callback(detected_faces, full_results):
-            """Called when new detections arrive via MQTT - uses queue"""
-            if detected_faces and active_websockets:
-                detection_data = {
-                    "type": "detections",
-                    "data": detected_faces,
-                    "timestamp": full_results.get("timestamp", ""),
-                    "frame_dimensions": full_results.get("frame_dimensions", {"width": 1280, "height": 720})
-                }
-
-                # Put message in queue instead of sending directly
-                try:
-                    websocket_message_queue.put_nowait(detection_data)
-                except queue.Full:
-                    logger.warning("WebSocket message queue is full, dropping message")
-
-        def on_status_change_callback(status_type, status_value):
-            """Called when service status changes - uses queue"""
-            status_data = {
-                "type": "status_change",
-                "status_type": status_type,
-                "status_value": status_value,
-                "timestamp": datetime.now().isoformat()
+def setup_stream_client(camera_id, client):
+    """Wire a newly created camera client into the detection WebSocket fan-out"""
+    hub = detection_hubs.setdefault(camera_id, DetectionHub(queue_size=DETECTIONS_WS_QUEUE_SIZE))
+    delta_encoder = detection_deltas.setdefault(camera_id, DetectionDeltaEncoder(
+        move_threshold=DETECTIONS_DELTA_MOVE_THRESHOLD,
+        resync_interval=DETECTIONS_DELTA_RESYNC_SECONDS
+    ))
+
+    def on_detection_callback(detected_faces, full_results):
+        """Called on the MQTT thread when new detections arrive; pushes them to every subscriber"""
+        timestamp = full_results.get("timestamp", "")
+        frame_dimensions = full_results.get("frame_dimensions", {"width": 1280, "height": 720})
+        # Record on the edge clock so replayed boxes line up with recorded frames
+        capture_time = client.detection_aligner.parse_timestamp(timestamp, time.time())
+
+        recorder = incident_recorders.get(camera_id)
+        if recorder is not None:
+            recorder.record_detections(full_results, timestamp=capture_time)
+        if detection_store is not None:
+            detection_store.record(camera_id, capture_time, detected_faces, frame_dimensions)
+
+        # Delta state is kept even without subscribers so new clients get a current snapshot
+        delta = delta_encoder.update(detected_faces, timestamp, frame_dimensions)
+        if delta is not None and hub.has_subscribers(DETECTIONS_TOPIC_DELTA):
+            delta["camera_id"] = camera_id
+            hub.publish(delta, topic=DETECTIONS_TOPIC_DELTA)
+
+        if detected_faces and hub.has_subscribers(DETECTIONS_TOPIC_FULL):
+            detection_data = {
+                "type": "detections",
+                "camera_id": camera_id,
+                "data": detected_faces,
+                "timestamp": timestamp,
+                "frame_dimensions": frame_dimensions
             }
+            # Serialized once per wire format, shared by every subscriber
+            hub.publish(detection_data, topic=DETECTIONS_TOPIC_FULL)
+
+    def on_status_change_callback(status_type, status_value):
+        """Called when service status changes; pushes the change to every subscriber"""
+        status_data = {
+            "type": "status_change",
+            "camera_id": camera_id,
+            "status_type": status_type,
+            "status_value": status_value,
+            "timestamp": datetime.now().isoformat()
+        }
+        hub.publish(status_data)
+
+    # Set callbacks
+    client.set_callbacks(
+        on_detection=on_detection_callback,
+        on_status_change=on_status_change_callback
+    )
+
+def initialize_camera_registry():
+    """Initialize the registry of configured cameras"""
+    global camera_registry
+    if camera_registry is None:
+        camera_registry = CameraRegistry(
+            STREAM_CAMERAS,
+            max_concurrent_decodes=STREAM_MAX_CONCURRENT_DECODES,
+            on_client_created=setup_stream_client
+        )
+    return camera_registry
+
+def require_camera(camera_id: str):
+    """Raise 404 for camera ids that are not configured"""
+    if camera_id not in initialize_camera_registry():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown camera '{camera_id}', expected one of {initialize_camera_registry().camera_ids}"
+        )
 
-            try:
-                websocket_message_queue.put_nowait(status_data)
-            except queue.Full:
-                logger.warning("WebSocket message queue is full, dropping status message")
+def require_encoder(encoder: str):
+    """Raise a 400 unless the image encoder is known and installed"""
+    if encoder not in available_encoders():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown encoder '{encoder}', expected one of {available_encoders()}"
+        )
 
-        # Set callbacks
-        stream_client.set_callbacks(
-            on_detection=on_detection_callback,
-            on_status_change=on_status_change_callback
+def initialize_stream_client(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Initialize the MQTT/RTSP stream client of a camera wired into the detection fan-out"""
+    return initialize_camera_registry().get_client(camera_id)
+
+def initialize_stream_broadcaster(camera_id: str = STREAM_DEFAULT_CAMERA, sync_mode: str = "live",
+                                  draw_overlay: bool = True):
+    """
+    Initialize a camera's shared broadcaster for a sync mode on top of its stream client.
+    draw_overlay=False is the WebSocket video channel: clean frames plus detections.
+    """
+    key = (camera_id, sync_mode, draw_overlay)
+    if key not in stream_broadcasters:
+        stream_broadcasters[key] = MJPEGBroadcaster(
+            initialize_stream_client(camera_id),
+            display_width=STREAM_DISPLAY_WIDTH,
+            jpeg_quality=STREAM_JPEG_QUALITY,
+            target_fps=STREAM_TARGET_FPS,
+            max_viewers=STREAM_MAX_SESSIONS,
+            change_detector=FrameChangeDetector(
+                threshold=STREAM_CHANGE_THRESHOLD,
+                max_static_seconds=STREAM_MAX_STATIC_SECONDS
+            ),
+            sync_mode=sync_mode,
+            draw_overlay=draw_overlay,
+            encoder=STREAM_ENCODER
+        )
+    return stream_broadcasters[key]
+
+def initialize_snapshot_cache(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Initialize a camera's latest-frame snapshot cache on top of its stream client"""
+    if camera_id not in snapshot_caches:
+        snapshot_caches[camera_id] = SnapshotCache(
+            initialize_stream_client(camera_id),
+            jpeg_quality=STREAM_JPEG_QUALITY,
+            max_age=SNAPSHOT_MAX_AGE,
+            encoder=STREAM_ENCODER
+        )
+    return snapshot_caches[camera_id]
+
+def initialize_detection_store():
+    """Open the detection history database and start its writer (None if disabled)"""
+    global detection_store
+    if HISTORY_ENABLED and detection_store is None:
+        detection_store = DetectionStore(
+            HISTORY_DB_PATH,
+            batch_size=HISTORY_BATCH_SIZE,
+            retention_seconds=HISTORY_RETENTION_DAYS * 86400 if HISTORY_RETENTION_DAYS else None
+        )
+        detection_store.start()
+    return detection_store
+
+def initialize_hls_segmenter(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Initialize a camera's on-demand HLS segment writer on top of its stream client"""
+    if camera_id not in hls_segmenters:
+        hls_segmenters[camera_id] = HLSSegmenter(
+            initialize_stream_client(camera_id),
+            directory=HLS_DIR / camera_id,
+            segment_seconds=HLS_SEGMENT_SECONDS,
+            playlist_size=HLS_PLAYLIST_SIZE,
+            fps=HLS_FPS,
+            width=HLS_WIDTH,
+            fourccs=HLS_FOURCCS,
+            idle_timeout=HLS_IDLE_TIMEOUT
         )
+    return hls_segmenters[camera_id]
+
+def initialize_crop_cache(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Initialize a camera's per-person crop cache on top of its stream client"""
+    if camera_id not in crop_caches:
+        crop_caches[camera_id] = DetectionCropCache(
+            initialize_stream_client(camera_id),
+            jpeg_quality=CROP_JPEG_QUALITY,
+            padding=CROP_PADDING
+        )
+    return crop_caches[camera_id]
+
+def initialize_incident_recorder(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Create a camera's incident recorder, picking up segments left by earlier runs"""
+    if camera_id not in incident_recorders:
+        incident_recorders[camera_id] = IncidentRecorder(
+            initialize_stream_client(camera_id),
+            directory=RECORDER_DIR / camera_id,
+            segment_size=RECORDER_SEGMENT_SIZE,
+            max_segments=RECORDER_MAX_SEGMENTS,
+            record_fps=RECORDER_FPS,
+            jpeg_quality=RECORDER_JPEG_QUALITY,
+            reorder_window=RECORDER_REORDER_WINDOW
+        )
+    return incident_recorders[camera_id]
 
-    return stream_client
+def start_stream_services(client):
+    """Start a camera's RTSP/MQTT services, its incident recorder and the detection history writer"""
+    if not client.is_running and not client.start_services():
+        return False
+    if RECORDER_ENABLED:
+        initialize_incident_recorder(client.CAMERA_ID).start()
+    initialize_detection_store()
+    return True
 
-def generate_frames():
-    """Generate frames for HTTP streaming using your MQTT client logic"""
-    client = initialize_stream_client()
+def parse_replay_time(value: str) -> float:
+    """Parse a replay bound given as epoch seconds or an ISO 8601 datetime"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time '{value}', expected epoch seconds or ISO 8601")
+
+def render_replay_frame(client, jpeg_bytes, detections, frame_dimensions):
+    """Draw recorded detections on a recorded JPEG frame and re-encode it"""
+    frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return jpeg_bytes
+    # Boxes are in camera coordinates; the recording may be downscaled
+    scale_x = frame.shape[1] / frame_dimensions.get("width", frame.shape[1])
+    scale_y = frame.shape[0] / frame_dimensions.get("height", frame.shape[0])
+    frame = client.overlay_renderer.draw(frame, detections, scale_x, scale_y)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, RECORDER_JPEG_QUALITY])
+    return buffer.tobytes() if ret else jpeg_bytes
+
+async def generate_replay(recorder: IncidentRecorder, start: float, end: float, speed: float, overlay: bool):
+    """Yield recorded frames between start and end as multipart chunks, paced by their timestamps"""
+    client = recorder.stream_client
+    records = recorder.iter_records(start, end)
+    detections = []
+    frame_dimensions = {}
+    previous_ts = None
 
     while True:
-        try:
-            # Use your existing logic to get frame with detections
-            frame_display = client.get_latest_frame_with_detections(display_width=800)
+        # Segment reads are blocking file I/O
+        record = await asyncio.to_thread(next, records, None)
+        if record is None:
+            break
+
+        if record.kind != RECORD_FRAME:
+            message = json_lib.loads(record.payload)
+            detections = message.get("detected_faces", [])
+            frame_dimensions = message.get("frame_dimensions", {})
+            continue
+
+        if previous_ts is not None:
+            await asyncio.sleep(min(record.timestamp - previous_ts, REPLAY_MAX_GAP_SECONDS) / speed)
+        previous_ts = record.timestamp
+
+        jpeg_bytes = record.payload
+        if overlay and detections:
+            jpeg_bytes = await asyncio.to_thread(render_replay_frame, client, jpeg_bytes, detections, frame_dimensions)
+        yield build_mjpeg_part(jpeg_bytes)
+
+def stream_session_count(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Active video sessions across all of a camera's broadcasters"""
+    return sum(broadcaster.viewer_count for (camera, _, _), broadcaster in stream_broadcasters.items()
+               if camera == camera_id)
+
+def viewer_profile(render_width, level, encoder=STREAM_ENCODER):
+    """Map a rendition, adaptive stream level and encoder to the broadcaster's viewer profile"""
+    scale = min(1.0, level.width / STREAM_DISPLAY_WIDTH)
+    return ViewerProfile(render_width=render_width, scale=scale, jpeg_quality=level.jpeg_quality, fps=level.fps,
+                         encoder=encoder)
+
+async def generate_frames(broadcaster: MJPEGBroadcaster, is_disconnected, rendition: str,
+                          adaptive: bool = True, keepalive: float = STREAM_KEEPALIVE_SECONDS,
+                          websocket: bool = False, encoder: str = STREAM_ENCODER):
+    """
+    Yield payloads for one viewer, awaiting frames from the shared broadcaster:
+    multipart chunks, or binary WebSocket messages when websocket is True.
+    Each viewer adapts its own frame rate, quality and width to how fast its
+    socket drains; frames that arrive while a send is in flight are skipped.
+    While the scene is static the last frame is re-sent every keepalive seconds
+    (0 disables re-sending).
+    """
+    render_width = STREAM_RENDITIONS[rendition]
+    if adaptive:
+        controller = AdaptiveRateController(STREAM_LEVELS, start_level=STREAM_START_LEVEL)
+    else:
+        # A single-rung ladder pins the viewer to the start level
+        controller = AdaptiveRateController([STREAM_LEVELS[STREAM_START_LEVEL]])
+
+    profile = viewer_profile(render_width, controller.level, encoder)
+    broadcaster.update_viewer_profile(new_profile=profile)
+    last_seq = 0
+    last_payload = None
+    last_sent_at = time.monotonic()
 
-            if frame_display is not None:
-                last_frame =  frame_display.copy()
-            elif last_frame is not None:
-                frame_display = last_frame
+    try:
+        while not await is_disconnected():
+            frame_started = time.monotonic()
+            rendered = await broadcaster.wait_for_frame_async(after_seq=last_seq, timeout=1.0)
+            if rendered is None:
+                # No new frame (static scene or stalled camera): optional keep-alive
+                if last_payload is not None and keepalive > 0 and frame_started - last_sent_at >= keepalive:
+                    last_sent_at = time.monotonic()
+                    yield last_payload
+                continue
+
+            # Normally pre-encoded by the broadcast thread; encode off-loop if not
+            if websocket:
+                payload = rendered.get_cached_message(profile)
+                if payload is None:
+                    payload = await asyncio.to_thread(broadcaster.build_message, rendered, profile)
             else:
-                # Send a black frame if no stream available
-                frame_display = np.zeros((450, 800, 3), dtype=np.uint8)
-                cv2.putText(frame_display, "No RTSP Stream", (250, 225),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame_display, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if not ret:
+                encoded = rendered.get_cached(profile)
+                if encoded is None:
+                    encoded = await asyncio.to_thread(broadcaster.encode_variant, rendered, profile)
+                payload = encoded.part if encoded is not None else None
+            # Past this frame even if it failed to encode, or the loop would retry it until the next publish
+            last_seq = rendered.seq
+            if payload is None:
                 continue
 
-            frame_bytes = buffer.tobytes()
+            last_payload = payload
+            send_started = time.monotonic()
+            yield payload
+            last_sent_at = time.monotonic()
+            send_seconds = last_sent_at - send_started
+
+            # Frames published while this send was in flight are dropped, not queued
+            backlog = broadcaster.latest_seq - rendered.seq
+            new_profile = viewer_profile(render_width, controller.record_send(len(payload), send_seconds, backlog),
+                                         encoder)
+            if new_profile != profile:
+                broadcaster.update_viewer_profile(old_profile=profile, new_profile=new_profile)
+                profile = new_profile
+
+            remaining = controller.frame_interval - (time.monotonic() - frame_started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+    finally:
+        broadcaster.update_viewer_profile(old_profile=profile)
+
+class MJPEGStreamResponse(StreamingResponse):
+    """StreamingResponse that releases its broadcaster session however the stream ends"""
+
+    def __init__(self, broadcaster: MJPEGBroadcaster, request: Request, rendition: str,
+                 adaptive: bool = True, keepalive: float = STREAM_KEEPALIVE_SECONDS, encoder: str = STREAM_ENCODER):
+        super().__init__(
+            generate_frames(broadcaster, request.is_disconnected, rendition, adaptive=adaptive, keepalive=keepalive,
+                            encoder=encoder),
+            media_type="multipart/x-mixed-replace; boundary=frame"
+        )
+        self.broadcaster = broadcaster
 
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.333)
-        except Exception as e:
-            logger.error(f"Error in generate_frames: {e}")
-            time.sleep(0.1)
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Runs on normal completion, client disconnect and cancellation alike
+            await self.body_iterator.aclose()
+            self.broadcaster.remove_viewer()
 
 # Health check
 @app.get("/")
@@ -529,52 +897,248 @@ async def get_deployment_status(deployment_id: str):
 
 
 # Stream endpoints using your MQTT client
+@app.get("/api/cameras")
+async def list_cameras():
+    """Configured cameras and whether each one is running"""
+    return initialize_camera_registry().get_stats()
+
 @app.get("/api/stream/video")
-async def video_stream():
+@app.get("/api/cameras/{camera_id}/video")
+async def video_stream(request: Request, rendition: str = STREAM_DEFAULT_RENDITION, adaptive: bool = True,
+                       keepalive: float = STREAM_KEEPALIVE_SECONDS, sync: str = "live",
+                       encoder: str = STREAM_ENCODER, camera_id: str = STREAM_DEFAULT_CAMERA):
     """HTTP endpoint for video streaming using your MQTT client"""
-    client = initialize_stream_client()
+    require_camera(camera_id)
+    if rendition not in STREAM_RENDITIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown rendition '{rendition}', expected one of {list(STREAM_RENDITIONS)}"
+        )
+    if sync not in STREAM_SYNC_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sync mode '{sync}', expected one of {list(STREAM_SYNC_MODES)}"
+        )
+    require_encoder(encoder)
 
-    # Start services if not already running
-    if not client.is_running:
-        success = client.start_services()
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to start streaming services")
+    client = initialize_stream_client(camera_id)
 
-    return StreamingResponse(
-        generate_frames(),
-        media_type="multipart/x-mixed-replace; boundary=frame"
-    )
+    # Start services if not already running
+    if not start_stream_services(client):
+        raise HTTPException(status_code=500, detail="Failed to start streaming services")
+
+    broadcaster = initialize_stream_broadcaster(camera_id, sync)
+    if stream_session_count(camera_id) >= STREAM_MAX_SESSIONS or not broadcaster.add_viewer():
+        raise HTTPException(status_code=503, detail=f"Too many stream sessions (max {STREAM_MAX_SESSIONS})")
+
+    return MJPEGStreamResponse(broadcaster, request, rendition, adaptive=adaptive, keepalive=keepalive,
+                               encoder=encoder)
+
+@app.get("/api/stream/snapshot")
+@app.get("/api/cameras/{camera_id}/snapshot")
+async def stream_snapshot(request: Request, rendition: str = STREAM_DEFAULT_RENDITION,
+                          encoder: str = STREAM_ENCODER, camera_id: str = STREAM_DEFAULT_CAMERA):
+    """
+    Latest frame as a single image (JPEG unless ?encoder= asks for another
+    format). The ETag is built from the frame sequence number and the
+    detections drawn on it, so pollers sending If-None-Match get a 304
+    without any encode while neither changes.
+    """
+    require_camera(camera_id)
+    if rendition not in STREAM_RENDITIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown rendition '{rendition}', expected one of {list(STREAM_RENDITIONS)}"
+        )
+    require_encoder(encoder)
+
+    client = initialize_stream_client(camera_id)
+    if not start_stream_services(client):
+        raise HTTPException(status_code=500, detail="Failed to start streaming services")
+
+    cache = initialize_snapshot_cache(camera_id)
+    buffered = await asyncio.to_thread(cache.latest_frame)
+    if buffered is None:
+        raise HTTPException(status_code=503, detail="No frame captured yet")
+
+    detections = client.get_frame_detections(buffered)
+    etag = f'"{camera_id}-{buffered.seq}-{detections_tag(detections)}-{rendition}-{encoder}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Frame-Seq": str(buffered.seq),
+        "X-Frame-Timestamp": f"{buffered.timestamp:.3f}"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    image_bytes = await asyncio.to_thread(cache.get_image, buffered, STREAM_RENDITIONS[rendition], encoder,
+                                          detections)
+    if image_bytes is None:
+        if not client.frame_intact(buffered):
+            raise HTTPException(status_code=503, detail="Frame was overwritten while encoding, retry",
+                                headers={"Retry-After": "0"})
+        raise HTTPException(status_code=500, detail="Failed to encode snapshot")
+    return Response(content=image_bytes, media_type=get_encoder(encoder).content_type, headers=headers)
+
+@app.get("/api/stream/hls/index.m3u8")
+@app.get("/api/cameras/{camera_id}/hls/index.m3u8")
+async def hls_playlist(camera_id: str = STREAM_DEFAULT_CAMERA):
+    """
+    Live HLS playlist. The first request starts the segment writer, so the
+    playlist answers 503 with Retry-After until the first segment is done.
+    """
+    require_camera(camera_id)
+    if not HLS_ENABLED:
+        raise HTTPException(status_code=404, detail="HLS output is disabled")
+
+    client = initialize_stream_client(camera_id)
+    segmenter = initialize_hls_segmenter(camera_id)
+    if segmenter.unavailable_reason:
+        raise HTTPException(status_code=503, detail=f"HLS output unavailable: {segmenter.unavailable_reason}")
+    if not start_stream_services(client):
+        raise HTTPException(status_code=500, detail="Failed to start streaming services")
+
+    segmenter.touch()
+    playlist = segmenter.get_playlist()
+    if playlist is None:
+        raise HTTPException(status_code=503, detail="No HLS segment written yet",
+                            headers={"Retry-After": str(int(HLS_SEGMENT_SECONDS + 0.999))})
+    return Response(content=playlist, media_type="application/vnd.apple.mpegurl",
+                    headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/stream/hls/{segment_name}")
+@app.get("/api/cameras/{camera_id}/hls/{segment_name}")
+async def hls_segment(segment_name: str, camera_id: str = STREAM_DEFAULT_CAMERA):
+    """One MPEG-TS segment listed in the HLS playlist"""
+    require_camera(camera_id)
+    segmenter = hls_segmenters.get(camera_id)
+    if segmenter is not None and segmenter.unavailable_reason:
+        raise HTTPException(status_code=503, detail=f"HLS output unavailable: {segmenter.unavailable_reason}")
+    path = segmenter.segment_path(segment_name) if segmenter is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown HLS segment '{segment_name}'")
+    segmenter.touch()
+    return FileResponse(path, media_type="video/mp2t", headers={"Cache-Control": "max-age=60"})
+
+async def drain_incoming(websocket: WebSocket):
+    """Ignore client messages until it disconnects: Starlette only notices a disconnect while receiving"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@app.websocket("/api/stream/video/ws")
+@app.websocket("/api/cameras/{camera_id}/video/ws")
+async def websocket_video(websocket: WebSocket, rendition: str = STREAM_DEFAULT_RENDITION, adaptive: bool = True,
+                          keepalive: float = STREAM_KEEPALIVE_SECONDS, sync: str = "live",
+                          encoder: str = STREAM_ENCODER, camera_id: str = STREAM_DEFAULT_CAMERA):
+    """
+    Binary WebSocket video channel. Each message is one frame:
+    WS_FRAME_HEADER (seq u64, timestamp f64, metadata length u32, little-endian),
+    JSON metadata {seq, timestamp, content_type, detections, box_scale}, then the
+    image bytes. Frames are sent without boxes; clients draw detections themselves.
+    """
+    if (rendition not in STREAM_RENDITIONS or sync not in STREAM_SYNC_MODES
+            or encoder not in available_encoders() or camera_id not in initialize_camera_registry()):
+        await websocket.close(code=1008, reason="Unknown camera, rendition, sync mode or encoder")
+        return
+
+    client = initialize_stream_client(camera_id)
+    if not start_stream_services(client):
+        await websocket.close(code=1011, reason="Failed to start streaming services")
+        return
+
+    broadcaster = initialize_stream_broadcaster(camera_id, sync, draw_overlay=False)
+    if stream_session_count(camera_id) >= STREAM_MAX_SESSIONS or not broadcaster.add_viewer():
+        await websocket.close(code=1013, reason=f"Too many stream sessions (max {STREAM_MAX_SESSIONS})")
+        return
 
-@app.websocket("/api/stream/detections")
-async def websocket_detections(websocket: WebSocket):
-    """WebSocket endpoint for real-time detection data - now with queue processing"""
     await websocket.accept()
-    active_websockets.append(websocket)
 
-    client = initialize_stream_client()
+    receiver = asyncio.create_task(drain_incoming(websocket))
 
+    async def is_disconnected():
+        return receiver.done() or websocket.client_state != WebSocketState.CONNECTED
+
+    frames = generate_frames(broadcaster, is_disconnected, rendition, adaptive=adaptive, keepalive=keepalive,
+                             websocket=True, encoder=encoder)
     try:
-        while True:
-            # Process queued messages first
-            while not websocket_message_queue.empty():
-                try:
-                    message = websocket_message_queue.get_nowait()
-                    await websocket.send_text(json_lib.dumps(message))
-                except queue.Empty:
-                    break
-                except Exception as e:
-                    logger.error(f"Error sending queued message: {e}")
+        async for message in frames:
+            await websocket.send_bytes(message)
+    except (WebSocketDisconnect, RuntimeError):
+        logger.info("Video WebSocket client disconnected")
+    finally:
+        await frames.aclose()
+        receiver.cancel()
+        broadcaster.remove_viewer()
+
+@app.websocket("/api/stream/detections")
+@app.websocket("/api/cameras/{camera_id}/detections")
+async def websocket_detections(websocket: WebSocket, delta: bool = True, wire_format: str = Query("json", alias="format"),
+                               camera_id: str = STREAM_DEFAULT_CAMERA):
+    """
+    WebSocket endpoint for real-time detection data. Detections and status
+    changes are pushed as they arrive; a status summary follows every
+    DETECTIONS_WS_STATUS_INTERVAL seconds.
+
+    By default detections arrive as a detections_snapshot {seq, detections:
+    {key: detection}} on connect and then detections_delta messages {seq,
+    added, updated, removed} keyed by person_id, plus periodic snapshots.
+    ?delta=false sends the full "detections" list of every MQTT message.
+
+    Messages are JSON text frames unless the client negotiates another wire
+    format, either as a WebSocket subprotocol ("msgpack") or with ?format=;
+    binary formats are sent as binary frames.
+    """
+    if camera_id not in initialize_camera_registry():
+        await websocket.close(code=1008, reason=f"Unknown camera '{camera_id}'")
+        return
+
+    # A subprotocol offered by the client takes precedence over ?format=
+    subprotocol = next((name for name in websocket.scope.get("subprotocols", []) if name in available_formats()),
+                       None)
+    wire_format = subprotocol or wire_format
+    if wire_format not in available_formats():
+        await websocket.close(code=1008, reason=f"Unknown wire format, expected one of {available_formats()}")
+        return
+    serializer = get_format(wire_format)
+
+    await websocket.accept(subprotocol=subprotocol)
+    client = initialize_stream_client(camera_id)
+    hub = detection_hubs[camera_id]
+    subscription = hub.subscribe(DETECTIONS_TOPIC_DELTA if delta else DETECTIONS_TOPIC_FULL, wire_format)
+    seen_dropped = 0
+
+    async def send(payload):
+        if serializer.binary:
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
 
-            # Send periodic status updates
-            await asyncio.sleep(0.1)  # Check queue more frequently
+    receiver = asyncio.create_task(drain_incoming(websocket))
+    next_status_at = time.monotonic() + DETECTIONS_WS_STATUS_INTERVAL
 
-            # Send status every 10 iterations (every ~1 second)
-            if hasattr(websocket_detections, 'counter'):
-                websocket_detections.counter += 1
-            else:
-                websocket_detections.counter = 1
+    async def send_snapshot():
+        # Taken after subscribing: updates queued meanwhile are already in it and replay harmlessly
+        snapshot = detection_deltas[camera_id].snapshot()
+        snapshot["camera_id"] = camera_id
+        await send(hub.serialize(snapshot, serializer))
 
-            if websocket_detections.counter % 10 == 0:
+    try:
+        if delta:
+            await send_snapshot()
+
+        while not receiver.done():
+            message = await subscription.get(timeout=max(0.0, next_status_at - time.monotonic()))
+            if delta and subscription.dropped > seen_dropped:
+                # This client fell behind and lost updates: resynchronize it
+                seen_dropped = subscription.dropped
+                await send_snapshot()
+            if message is not None:
+                await send(message)
+
+            if time.monotonic() >= next_status_at:
+                next_status_at = time.monotonic() + DETECTIONS_WS_STATUS_INTERVAL
                 status_data = {
                     "type": "status",
                     "mqtt_connected": client.mqtt_connected,
@@ -582,22 +1146,24 @@ async def websocket_detections(websocket: WebSocket):
                     "is_running": client.is_running,
                     "timestamp": datetime.now().isoformat()
                 }
-                await websocket.send_text(json_lib.dumps(status_data))
+                await send(hub.serialize(status_data, serializer))
 
-    except WebSocketDisconnect:
-        if websocket in active_websockets:
-            active_websockets.remove(websocket)
+        logger.info("WebSocket client disconnected")
+    except (WebSocketDisconnect, RuntimeError):
         logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        if websocket in active_websockets:
-            active_websockets.remove(websocket)
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscription)
 
 @app.post("/api/stream/start")
-async def start_stream():
+@app.post("/api/cameras/{camera_id}/start")
+async def start_stream(camera_id: str = STREAM_DEFAULT_CAMERA):
     """Start RTSP and MQTT services using your client"""
+    require_camera(camera_id)
     try:
-        client = initialize_stream_client()
+        client = initialize_stream_client(camera_id)
 
         if client.is_running:
             return {
@@ -606,7 +1172,7 @@ async def start_stream():
                 **client.get_status()
             }
 
-        success = client.start_services()
+        success = start_stream_services(client)
 
         if success:
             # Wait a moment for connections to establish
@@ -625,14 +1191,19 @@ async def start_stream():
         raise HTTPException(status_code=500, detail=f"Failed to start stream services: {str(e)}")
 
 @app.post("/api/stream/stop")
-async def stop_stream():
+@app.post("/api/cameras/{camera_id}/stop")
+async def stop_stream(camera_id: str = STREAM_DEFAULT_CAMERA):
     """Stop RTSP and MQTT services"""
+    require_camera(camera_id)
     try:
-        client = initialize_stream_client()
+        client = initialize_stream_client(camera_id)
         client.stop_services()
-
-        # Clear WebSocket connections
-        active_websockets.clear()
+        if camera_id in detection_deltas:
+            detection_deltas[camera_id].clear()
+        if camera_id in incident_recorders:
+            incident_recorders[camera_id].stop()
+        if camera_id in hls_segmenters:
+            hls_segmenters[camera_id].stop()
 
         return {
             "status": "stopped",
@@ -647,22 +1218,50 @@ async def stop_stream():
         }
 
 @app.get("/api/stream/status")
-async def stream_status():
+@app.get("/api/cameras/{camera_id}/status")
+async def stream_status(camera_id: str = STREAM_DEFAULT_CAMERA):
     """Enhanced stream status using your MQTT client"""
+    require_camera(camera_id)
     try:
-        client = initialize_stream_client()
+        client = initialize_stream_client(camera_id)
         status = client.get_status()
+        delayed_key = (camera_id, "delayed", True)
 
         return {
             "status": "available" if status["is_running"] else "stopped",
+            "camera_id": camera_id,
             "rtsp_url": status["rtsp_url"],
+            "frame_source": status["frame_source"],
             "mqtt_broker": status["mqtt_broker"],
             "mqtt_topic": status["mqtt_topic"],
             "mqtt_connected": status["mqtt_connected"],
             "is_running": status["is_running"],
             "active_detections": status["active_detections"],
             "frame_queue_size": status["frame_queue_size"],
-            "active_websockets": len(active_websockets),
+            "latest_frame_seq": status["latest_frame_seq"],
+            "active_websockets": detection_hubs[camera_id].subscriber_count if camera_id in detection_hubs else 0,
+            "detection_hub": detection_hubs[camera_id].get_stats() if camera_id in detection_hubs else None,
+            "detection_deltas": detection_deltas[camera_id].get_stats() if camera_id in detection_deltas else None,
+            "frames_decoded": status["frames_decoded"],
+            "decodes_throttled": status["decodes_throttled"],
+            "broadcaster": initialize_stream_broadcaster(camera_id).get_stats(),
+            "delayed_broadcaster": (stream_broadcasters[delayed_key].get_stats()
+                                    if delayed_key in stream_broadcasters else None),
+            "websocket_broadcasters": [
+                broadcaster.get_stats() for (camera, _, draw_overlay), broadcaster in stream_broadcasters.items()
+                if camera == camera_id and not draw_overlay
+            ],
+            "alignment": status["alignment"],
+            "tracking": status["tracking"],
+            "mqtt_payloads": status["mqtt_payloads"],
+            "mqtt_ingest": status["mqtt_ingest"],
+            "overlay": status["overlay"],
+            "frame_pool": status["frame_pool"],
+            "recorder": incident_recorders[camera_id].get_stats() if camera_id in incident_recorders else None,
+            "snapshots": snapshot_caches[camera_id].get_stats() if camera_id in snapshot_caches else None,
+            "crops": crop_caches[camera_id].get_stats() if camera_id in crop_caches else None,
+            "hls": hls_segmenters[camera_id].get_stats() if camera_id in hls_segmenters else None,
+            "history": detection_store.get_stats() if detection_store is not None else None,
             "jupyterhub_user": JUPYTERHUB_USER
         }
     except Exception as e:
@@ -671,11 +1270,74 @@ async def stream_status():
             "error": str(e)
         }
 
+@app.get("/api/detections/history")
+async def detection_history(start: Optional[str] = Query(None, alias="from"), end: Optional[str] = Query(None, alias="to"),
+                            person_id: Optional[str] = None, camera_id: Optional[str] = None,
+                            min_confidence: Optional[float] = None, cursor: Optional[str] = None,
+                            limit: int = 100):
+    """
+    Stored detections, oldest first, filtered by time range (epoch seconds or
+    ISO 8601), person, camera and minimum confidence. Pass next_cursor back
+    as ?cursor= to get the following page.
+    """
+    store = initialize_detection_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Detection history is disabled")
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+
+    try:
+        detections, next_cursor = await asyncio.to_thread(
+            store.query,
+            start=parse_replay_time(start) if start is not None else None,
+            end=parse_replay_time(end) if end is not None else None,
+            camera_id=camera_id,
+            person_id=person_id,
+            min_confidence=min_confidence,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"detections": detections, "count": len(detections), "next_cursor": next_cursor}
+
+@app.get("/api/stream/replay")
+@app.get("/api/cameras/{camera_id}/replay")
+async def replay_stream(start: str = Query(..., alias="from"), end: str = Query(..., alias="to"),
+                        speed: float = 1.0, overlay: bool = True, camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Replay recorded video (with recorded detections drawn on it) between two times"""
+    require_camera(camera_id)
+    start_ts = parse_replay_time(start)
+    end_ts = parse_replay_time(end)
+    if end_ts < start_ts:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if not 0 < speed <= REPLAY_MAX_SPEED:
+        raise HTTPException(status_code=400, detail=f"speed must be in (0, {REPLAY_MAX_SPEED}]")
+
+    return StreamingResponse(
+        generate_replay(initialize_incident_recorder(camera_id), start_ts, end_ts, speed, overlay),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
+
+@app.get("/api/stream/replay/detections")
+@app.get("/api/cameras/{camera_id}/replay/detections")
+async def replay_detections(start: str = Query(..., alias="from"), end: str = Query(..., alias="to"),
+                            camera_id: str = STREAM_DEFAULT_CAMERA):
+    """Recorded detection messages between two times"""
+    require_camera(camera_id)
+    start_ts = parse_replay_time(start)
+    end_ts = parse_replay_time(end)
+
+    messages = await asyncio.to_thread(initialize_incident_recorder(camera_id).get_detections, start_ts, end_ts)
+    return {"messages": messages, "count": len(messages)}
+
 @app.get("/api/stream/detections/current")
-async def get_current_detections():
+@app.get("/api/cameras/{camera_id}/detections/current")
+async def get_current_detections(camera_id: str = STREAM_DEFAULT_CAMERA):
     """Get current detections without WebSocket"""
+    require_camera(camera_id)
     try:
-        client = initialize_stream_client()
+        client = initialize_stream_client(camera_id)
         detections = client.get_latest_detections()
 
         return {
@@ -690,6 +1352,39 @@ async def get_current_detections():
             "count": 0
         }
 
+@app.get("/api/stream/detections/{person_id}/crop")
+@app.get("/api/cameras/{camera_id}/detections/{person_id}/crop")
+async def get_detection_crop(request: Request, person_id: str, camera_id: str = STREAM_DEFAULT_CAMERA):
+    """
+    JPEG close-up of a person's latest detection box. Crops are cached per
+    frame, and the ETag changes only when a new frame or box is used, so
+    polling an unchanged detection returns 304.
+    """
+    require_camera(camera_id)
+    cache = initialize_crop_cache(camera_id)
+    target = cache.locate(person_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail=f"Person '{person_id}' is not currently detected")
+
+    etag = f'"{camera_id}-{target.frame.seq}-{person_id}-{"-".join(map(str, target.box))}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Frame-Seq": str(target.frame.seq),
+        "X-Frame-Timestamp": f"{target.frame.timestamp:.3f}"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    image_bytes = await asyncio.to_thread(cache.get_crop, target)
+    if image_bytes is None:
+        if not cache.stream_client.frame_intact(target.frame):
+            raise HTTPException(status_code=503, detail="Frame was overwritten while encoding, retry",
+                                headers={"Retry-After": "0"})
+        raise HTTPException(status_code=500, detail="Failed to encode crop")
+    return Response(content=image_bytes, media_type=cache.content_type, headers=headers)
+
 @app.post("/api/training/execute-notebook")
 async def execute_training_notebook(
     request: NotebookExecutionRequest,
@@ -954,15 +1649,43 @@ async def cleanup_system():
 
     return {"message": "Cleanup completed", "jupyterhub_user": JUPYTERHUB_USER}
 
+# Check optional outputs at startup, so a missing codec is in the log before anyone asks
+@app.on_event("startup")
+async def startup_event():
+    """Log the HLS codec, or loudly that HLS can't be served"""
+    if not HLS_ENABLED:
+        return
+    fourcc = await asyncio.to_thread(probe_fourcc, HLS_FOURCCS, HLS_FPS)
+    if fourcc is None:
+        logger.error(f"HLS OUTPUT DISABLED: this OpenCV build has no H.264 encoder (tried {list(HLS_FOURCCS)}); "
+                     f"the HLS endpoints will answer 503. Install an OpenCV built with H.264 support, "
+                     f"or set HLS_ENABLED = False.")
+    else:
+        logger.info(f"HLS output available, segments encoded as {fourcc}")
+
 # Cleanup on app shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup streaming services on shutdown"""
-    global stream_client
-    if stream_client is not None:
+    global camera_registry, detection_store
+    for broadcaster in stream_broadcasters.values():
+        broadcaster.stop()
+    stream_broadcasters.clear()
+    for recorder in incident_recorders.values():
+        recorder.stop()
+    incident_recorders.clear()
+    snapshot_caches.clear()
+    crop_caches.clear()
+    for segmenter in hls_segmenters.values():
+        segmenter.stop()
+    hls_segmenters.clear()
+    if detection_store is not None:
+        detection_store.stop()
+        detection_store = None
+    if camera_registry is not None:
         logger.info("Shutting down streaming services...")
-        stream_client.stop_services()
-        stream_client = None
+        camera_registry.stop_all()
+        camera_registry = None
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,114 @@
+import collections
+import threading
+import time
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ("oldest", "newest")
+
+
+class RawMessage(NamedTuple):
+    """An MQTT payload as received, before decoding"""
+    payload: bytes
+    received_at: float  # Wall-clock receive time, for detection alignment
+    enqueued_at: float  # perf_counter at enqueue, for queue wait accounting
+
+
+class StageTimer:
+    """Count, mean and max duration of one pipeline stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_stats(self):
+        return {
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else None,
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class MQTTIngestQueue:
+    """
+    Bounded hand-off between the paho network thread and the decode/dispatch
+    worker. put() only appends to a deque under a lock, so the network thread
+    never waits on decoding or detection callbacks. When the queue is full
+    the drop policy decides what is lost: "oldest" (default) evicts the
+    longest-waiting payload, since newer detections matter more; "newest"
+    rejects the incoming one. Either way the drop is counted.
+    """
+
+    def __init__(self, max_size=256, drop_policy="oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', expected one of {list(DROP_POLICIES)}")
+        self.max_size = max_size
+        self.drop_policy = drop_policy
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+
+        # Counters, one per stage
+        self.received = 0
+        self.dropped = 0
+        self.decoded = 0
+        self.decode_errors = 0
+        self.dispatched = 0
+        self.dispatch_errors = 0
+        self.stages = {name: StageTimer() for name in ("receive", "queue_wait", "decode", "dispatch")}
+
+    def put(self, payload):
+        """Timestamp and enqueue a raw payload (called on the network thread, never blocks)"""
+        started = time.perf_counter()
+        message = RawMessage(payload=payload, received_at=time.time(), enqueued_at=started)
+        with self._condition:
+            self.received += 1
+            if len(self._messages) >= self.max_size:
+                self.dropped += 1
+                if self.drop_policy == "newest":
+                    self.stages["receive"].record(time.perf_counter() - started)
+                    return
+                self._messages.popleft()
+            self._messages.append(message)
+            self._condition.notify()
+            self.stages["receive"].record(time.perf_counter() - started)
+
+    def get(self, timeout=None) -> Optional[RawMessage]:
+        """Oldest queued payload, or None if none arrives within timeout seconds"""
+        with self._condition:
+            if not self._messages and not self._condition.wait_for(lambda: self._messages, timeout=timeout):
+                return None
+            message = self._messages.popleft()
+        self.stages["queue_wait"].record(time.perf_counter() - message.enqueued_at)
+        return message
+
+    def clear(self):
+        """Discard queued payloads (the services stopped)"""
+        with self._condition:
+            self._messages.clear()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._messages)
+
+    def get_stats(self):
+        """Get ingest counters and per-stage latency for status endpoints"""
+        return {
+            "received": self.received,
+            "decoded": self.decoded,
+            "decode_errors": self.decode_errors,
+            "dispatched": self.dispatched,
+            "dispatch_errors": self.dispatch_errors,
+            "dropped": self.dropped,
+            "queued": len(self),
+            "max_size": self.max_size,
+            "drop_policy": self.drop_policy,
+            "latency": {name: timer.get_stats() for name, timer in self.stages.items()}
+        }
@@ -1,33 +1,113 @@
 import cv2
 import paho.mqtt.client as mqtt
-import json
+import multiprocessing
+import sys
 import threading
 import time
-import queue
-import imutils
 import logging
+import numpy as np
+from frame_buffer import FrameRingBuffer
+from shared_frame_ring import SharedFrameRing, decode_worker
+from frame_sources import make_frame_source
+from detection_alignment import DetectionAligner
+from detection_tracker import DetectionTracker
+from overlay import OverlayRenderer
+from frame_pool import FramePool
+from wire_formats import get_format, FormatStats
+from mqtt_ingest import MQTTIngestQueue
 
 logger = logging.getLogger(__name__)
 
 class RTSPMQTTStreamClient:
-    def __init__(self):
-        # Configuration - same as your original script
-        self.JETSON_RTSP_URL = "rtsp://192.168.2.100:8554/test"
-        self.MQTT_BROKER_HOST = "127.0.0.1"
-        self.MQTT_PORT = 1883
-        self.MQTT_TOPIC = "jetson/face_recognition/results"
+    def __init__(self, camera_id="default", rtsp_url=None, mqtt_topic=None, mqtt_host=None, mqtt_port=None,
+                 max_decode_fps=None, decode_slots=None, decode_worker_process=False, frame_source=None,
+                 payload_format="json"):
+        # Configuration - same as your original script, overridable per camera
+        self.CAMERA_ID = camera_id
+        self.JETSON_RTSP_URL = rtsp_url or "rtsp://192.168.2.100:8554/test"
+        # Where frames come from: the RTSP URL by default, or a FrameSource / spec
+        # string (file:///clip.mp4, synthetic://1280x720@30) for tests and load runs
+        self.frame_source = make_frame_source(frame_source or self.JETSON_RTSP_URL)
+        self.MQTT_BROKER_HOST = mqtt_host or "127.0.0.1"
+        self.MQTT_PORT = mqtt_port or 1883
+        self.MQTT_TOPIC = mqtt_topic or "jetson/face_recognition/results"
+        # Decoder for the Jetson's payloads (wire_formats name: json, or msgpack if installed)
+        self.MQTT_PAYLOAD_FORMAT = payload_format
+        self.payload_decoder = get_format(payload_format)
+        self.payload_stats = FormatStats()
+        # Ingest: the paho thread only enqueues raw payloads; a worker decodes and
+        # dispatches them. When MQTT_INGEST_QUEUE_SIZE are waiting, the oldest
+        # (or, with drop policy "newest", the incoming) payload is dropped
+        self.MQTT_INGEST_QUEUE_SIZE = 256
+        self.MQTT_INGEST_DROP_POLICY = "oldest"
+        self.ingest_queue = MQTTIngestQueue(self.MQTT_INGEST_QUEUE_SIZE, self.MQTT_INGEST_DROP_POLICY)
+
+        # Decode limits: at most MAX_DECODE_FPS decodes per second for this camera
+        # (None = unlimited), each holding one of the decode slots shared by all cameras
+        self.MAX_DECODE_FPS = max_decode_fps
+        self.DECODE_SLOT_TIMEOUT = 0.05  # Skip the decode rather than stall grabbing
+        self.decode_slots = decode_slots  # Optional threading.Semaphore
+
+        # Out-of-process decoding: a worker process captures and decodes into a
+        # shared-memory ring of SHARED_FRAME_SIZE slots instead of a thread here
+        self.DECODE_WORKER_PROCESS = decode_worker_process
+        self.SHARED_FRAME_SIZE = (1280, 720)  # Larger frames are downscaled to fit
+
+        # Frame history used to pair late MQTT detections with their frames
+        self.FRAME_HISTORY_SIZE = 30
+        self.FRAME_HISTORY_FPS = 10.0  # Decode rate while a consumer needs continuous history
+        self.DETECTION_CLOCK_OFFSET = 0.0  # Seconds added to Jetson timestamps to reach the edge clock
+        self.RTSP_LATENCY = 0.0  # Seconds between capture on the Jetson and grab on the edge
+
+        # Tracking: stable track ids across MQTT messages and boxes moved to each
+        # frame's capture time, so overlays glide between ~1 fps inference updates
+        self.TRACKING_ENABLED = True
+        self.TRACK_IOU_THRESHOLD = 0.3
+        self.TRACK_MAX_AGE = 3.0  # Seconds an unmatched track is kept for re-identification
+        self.TRACK_MAX_EXTRAPOLATION = 1.5  # Seconds boxes keep moving past the last message
 
         # Global variables - same as your original
         self.latest_detections = []
         self.detections_lock = threading.Lock()
-        self.frame_queue = queue.Queue(maxsize=5)
+        if self.DECODE_WORKER_PROCESS:
+            self.frame_buffer = SharedFrameRing(
+                capacity=self.FRAME_HISTORY_SIZE,
+                max_width=self.SHARED_FRAME_SIZE[0],
+                max_height=self.SHARED_FRAME_SIZE[1]
+            )
+            self.frame_buffer.on_rtsp_status = self._on_worker_rtsp_status
+        else:
+            self.frame_buffer = FrameRingBuffer(capacity=self.FRAME_HISTORY_SIZE)
+        self.detection_aligner = DetectionAligner(
+            self.frame_buffer,
+            clock_offset=self.DETECTION_CLOCK_OFFSET,
+            rtsp_latency=self.RTSP_LATENCY
+        )
+        self.tracker = DetectionTracker(
+            iou_threshold=self.TRACK_IOU_THRESHOLD,
+            max_age=self.TRACK_MAX_AGE,
+            max_extrapolation=self.TRACK_MAX_EXTRAPOLATION
+        )
+        self._history_users = 0
+        self._history_lock = threading.Lock()
+        self.overlay_renderer = OverlayRenderer()
+        # Reusable capture/render arrays: enough for the whole history plus frames in flight
+        self.frame_pool = FramePool(max_per_shape=self.FRAME_HISTORY_SIZE + 10)
+        self._frame_shape = None  # Shape of the last decoded frame, to pick pooled capture arrays
 
         # Control variables
         self.mqtt_client = None
+        self.ingest_thread = None
         self.rtsp_thread = None
+        self.decode_process = None
         self.is_running = False
         self.mqtt_connected = False
 
+        # Decode-on-demand counters: every frame is grabbed, only wanted ones decoded
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.decodes_throttled = 0  # Decodes deferred by the rate limit or a busy decode pool
+
         # Callbacks for external integration
         self.on_detection_callback = None
         self.on_frame_callback = None
@@ -48,41 +128,65 @@ class RTSPMQTTStreamClient:
                 self.on_status_change_callback("mqtt_connected", False)
 
     def on_message(self, client, userdata, msg):
-        """MQTT message callback - same as your original"""
+        """MQTT message callback: runs on the paho network thread, so it only timestamps and enqueues"""
+        self.ingest_queue.put(msg.payload)
+
+    def ingest_loop(self):
+        """Decode and dispatch queued MQTT payloads until the services stop"""
+        while self.is_running or len(self.ingest_queue):
+            message = self.ingest_queue.get(timeout=0.5)
+            if message is None:
+                continue
+            try:
+                self.process_payload(message.payload, message.received_at)
+            except Exception as e:
+                # One bad payload must not kill the only ingest thread
+                logger.error(f"Error handling MQTT payload: {e}")
+
+    def process_payload(self, payload, received_at=None):
+        """Decode one detection payload and hand it to the tracker, aligner and callbacks"""
+        received_at = received_at if received_at is not None else time.time()
+        ingest = self.ingest_queue
+        started = time.perf_counter()
         try:
-            # Decode the JSON payload
-            results = json.loads(msg.payload.decode())
-
-            # Your original test data structure (keep for fallback)
-            results_1 = {
-                'timestamp': '2025-07-07T19:56:14.855707',
-                'frame_dimensions': {'width': 1280, 'height': 720},
-                'detected_faces': [{
-                    "box": [100, 50, 150, 200],  # x, y, width, height
-                    "name": "John Doe",
-                    "confidence": 95,
-                    "person_id": "some_id_123"
-                }],
-                'flask_processing_fps': 0.9458355583137295,
-                'avg_inference_time_ms': 1086.901370684306
-            }
+            results = self.payload_decoder.loads(payload)
+        except Exception as e:
+            # Malformed input can raise more than ValueError (e.g. RecursionError from deeply nested JSON)
+            ingest.decode_errors += 1
+            logger.error(f"Error decoding {self.payload_decoder.name} payload from MQTT: {e}")
+            return
+        decoded = time.perf_counter()
+        self.payload_stats.record(self.payload_decoder.name, len(payload), decoded - started)
+        ingest.stages["decode"].record(decoded - started)
+        ingest.decoded += 1
 
+        try:
             # Extract detected faces
             detected_faces = results.get("detected_faces", [])
 
+            if self.TRACKING_ENABLED:
+                # Tag each face with a stable track_id (matched at the inferred frame's capture time)
+                capture_time = self.detection_aligner.parse_timestamp(results.get("timestamp"), received_at)
+                detected_faces = self.tracker.update(detected_faces, capture_time)
+
             with self.detections_lock:
                 self.latest_detections = detected_faces
 
-            logger.info(f"Received {len(detected_faces)} detections via MQTT.")
+            # Pair with the buffered frame the Jetson ran inference on
+            self.detection_aligner.add_message(results, detected_faces, received_at)
+
+            logger.debug(f"Received {len(detected_faces)} detections via MQTT.")
 
             # Call external callback if provided
             if self.on_detection_callback:
                 self.on_detection_callback(detected_faces, results)
+            ingest.dispatched += 1
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON from MQTT: {e}")
         except Exception as e:
+            ingest.dispatch_errors += 1
             logger.error(f"Error processing MQTT message: {e}")
+        finally:
+            ingest.stages["dispatch"].record(time.perf_counter() - decoded)
 
     def on_disconnect(self, client, userdata, rc):
         """MQTT disconnect callback"""
@@ -94,46 +198,55 @@ class RTSPMQTTStreamClient:
     def rtsp_reader_loop(self):
         """RTSP stream reader thread - same as your original"""
         cap = None
+        last_decoded_at = 0.0
         while self.is_running:
             try:
                 if cap is None or not cap.isOpened():
-                    logger.info(f"Attempting to open RTSP stream: {self.JETSON_RTSP_URL}")
-                    cap = cv2.VideoCapture(self.JETSON_RTSP_URL)
+                    logger.info(f"Attempting to open frame source: {self.frame_source.describe()}")
+                    cap = self.frame_source.open()
                     if not cap.isOpened():
-                        logger.warning("Failed to open RTSP stream. Retrying in 5 seconds...")
+                        logger.warning("Failed to open frame source. Retrying in 5 seconds...")
                         time.sleep(5)
                         continue
-                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer for lower latency
-                    logger.info("RTSP stream opened successfully.")
+                    logger.info("Frame source opened successfully.")
                     if self.on_status_change_callback:
                         self.on_status_change_callback("rtsp_connected", True)
 
-                ret, frame = cap.read()
+                # Grab every frame to keep the stream drained, but only decode
+                # when a reader has asked for a frame newer than the latest one
+                ret = cap.grab()
                 if ret:
-                    print(f"DEBUG: Successfully read frame {frame.shape}, queue size: {self.frame_queue.qsize()}")
-                    try:
-                        # Put frame into queue, dropping oldest if full
-                        self.frame_queue.put_nowait(frame)
-
-                        # Call external callback if provided
-                        if self.on_frame_callback:
-                            self.on_frame_callback(frame)
-
-                    except queue.Full:
-                        try:
-                            self.frame_queue.get_nowait()  # Discard oldest
-                            self.frame_queue.put_nowait(frame)
-                        except queue.Empty:
-                            pass
+                    grabbed_at = time.time()
+                    self.frames_grabbed += 1
+
+                    # Consumers of delayed/aligned video also need a steady history
+                    history_due = (self._history_users > 0
+                                   and grabbed_at - last_decoded_at >= 1.0 / self.FRAME_HISTORY_FPS)
+
+                    if self.frame_buffer.has_demand() or history_due:
+                        ret, frame = self._retrieve(cap, grabbed_at - last_decoded_at)
+                        if ret:
+                            last_decoded_at = grabbed_at
+                            self.frames_decoded += 1
+                            # Overwrite the oldest slot; readers peek without consuming
+                            self.frame_buffer.put(frame, timestamp=grabbed_at)
+
+                            # Call external callback if provided (decoded frames only)
+                            if self.on_frame_callback:
+                                self.on_frame_callback(frame)
+
+                    if self.frames_grabbed % 300 == 0:
+                        logger.debug(f"RTSP frames grabbed: {self.frames_grabbed}, decoded: {self.frames_decoded}")
                 else:
-                    logger.warning("Failed to read frame from RTSP stream. Re-initializing capture...")
+                    logger.warning("Failed to read frame from frame source. Re-initializing capture...")
                     if cap is not None:
                         cap.release()
                     cap = None
                     if self.on_status_change_callback:
                         self.on_status_change_callback("rtsp_connected", False)
 
-                time.sleep(0.01)  # Small sleep to prevent busy-waiting
+                if self.frame_source.idle_sleep:
+                    time.sleep(self.frame_source.idle_sleep)
 
             except Exception as e:
                 logger.error(f"Error in RTSP reader loop: {e}")
@@ -149,68 +262,158 @@ class RTSPMQTTStreamClient:
             cap.release()
         logger.info("RTSP reader loop stopped")
 
-    def get_latest_frame_with_detections(self, display_width=800):
+    def _retrieve(self, cap, since_last_decode):
         """
-        Get the latest frame with detection overlays applied
-        Same logic as your original display loop
+        Decode the grabbed frame unless this camera is over its decode rate or
+        no shared decode slot frees up in time. A deferred decode stays
+        demanded and is retried on the next grabbed frame.
         """
+        if self.MAX_DECODE_FPS and since_last_decode < 1.0 / self.MAX_DECODE_FPS:
+            self.decodes_throttled += 1
+            return False, None
+        if self.decode_slots is None:
+            return self._decode_into_pool(cap)
+
+        if not self.decode_slots.acquire(timeout=self.DECODE_SLOT_TIMEOUT):
+            self.decodes_throttled += 1
+            return False, None
         try:
-            # Get the latest frame from the queue (non-blocking)
-            frame = self.frame_queue.get_nowait()
-            if hasattr(self, '_frame_count'):
-                self._frame_count += 1
-            else:
-                self._frame_count = 1
+            return self._decode_into_pool(cap)
+        finally:
+            self.decode_slots.release()
+
+    def _decode_into_pool(self, cap):
+        """Decode into a pooled array of the last frame's shape (OpenCV reallocates if it changed)"""
+        if self._frame_shape is None:
+            ret, frame = cap.retrieve()
+        else:
+            ret, frame = cap.retrieve(image=self.frame_pool.acquire(self._frame_shape))
+        if ret:
+            self._frame_shape = frame.shape
+        return ret, frame
+
+    def _start_decode_process(self):
+        """Run capture and decode in a worker process feeding the shared frame ring"""
+        self.frame_buffer.request_stop(False)
+        self.frame_buffer.start_watching()
+        # Spawn rather than fork: this process runs threads and an event loop
+        context = multiprocessing.get_context("spawn")
+        self.decode_process = context.Process(
+            target=decode_worker,
+            args=(self.frame_buffer.name, self.frame_source, self.MAX_DECODE_FPS, self.frame_buffer.notify),
+            name=f"decode-{self.CAMERA_ID}",
+            daemon=True
+        )
+        self.decode_process.start()
+        logger.info(f"Decode worker process started (pid {self.decode_process.pid})")
+
+    def _stop_decode_process(self):
+        self.frame_buffer.request_stop()
+        self.decode_process.join(timeout=5)
+        if self.decode_process.is_alive():
+            logger.warning("Decode worker did not stop, terminating it")
+            self.decode_process.terminate()
+            self.decode_process.join(timeout=1)
+        self.decode_process = None
+        self.frame_buffer.stop_watching()
+
+    def _on_worker_rtsp_status(self, connected):
+        if self.on_status_change_callback:
+            self.on_status_change_callback("rtsp_connected", connected)
 
-            if self._frame_count % 30 == 0:  # Every ~1 second
-                logger.debug(f"Processing frame {self._frame_count}, queue size: {self.frame_queue.qsize()}")
-        except queue.Empty:
+    def get_latest_frame_with_detections(self, display_width=800, after_seq=0):
+        """
+        Get the latest frame with detection overlays applied
+        Peeks at the ring buffer, so concurrent callers all see the same frames.
+        Returns None if there is no frame newer than after_seq.
+        """
+        buffered = self.frame_buffer.latest()
+        if buffered is None or buffered.seq <= after_seq:
+            # Ask the reader to decode the next frame for us
+            self.frame_buffer.request_newer(after_seq)
             return None
 
+        return self.render_buffered_frame(buffered, display_width, detections=self.get_frame_detections(buffered))
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Block until a frame newer than after_seq is captured (BufferedFrame or None)"""
+        return self.frame_buffer.wait_for_newer(after_seq, timeout=timeout)
+
+    def acquire_frame_history(self):
+        """Keep decoding at FRAME_HISTORY_FPS even without explicit frame demand"""
+        with self._history_lock:
+            self._history_users += 1
+            if self.DECODE_WORKER_PROCESS:
+                self.frame_buffer.history_fps = self.FRAME_HISTORY_FPS
+
+    def release_frame_history(self):
+        """Undo acquire_frame_history"""
+        with self._history_lock:
+            self._history_users = max(0, self._history_users - 1)
+            if self.DECODE_WORKER_PROCESS and self._history_users == 0:
+                self.frame_buffer.history_fps = 0
+
+    def get_delayed_frame(self, tolerance=1.0):
+        """
+        Frame held back by the measured MQTT detection latency, paired with the
+        detections inferred closest to it: (BufferedFrame, detections) or None
+        """
+        selected = self.detection_aligner.delayed_frame(tolerance=tolerance)
+        if selected is None or not self.TRACKING_ENABLED:
+            return selected
+        # Interpolate between the detection messages on either side of the frame
+        return selected[0], self.get_frame_detections(selected[0])
+
+    def get_frame_detections(self, buffered):
+        """
+        Detections to draw on a buffered frame: tracked boxes moved to the
+        frame's capture time, or the latest MQTT detections without tracking
+        """
+        if not self.TRACKING_ENABLED:
+            return self.get_latest_detections()
+        return self.tracker.boxes_at(self.detection_aligner.frame_capture_time(buffered))
+
+    def frame_intact(self, buffered) -> bool:
+        """False if a buffered frame's pixels were overwritten while in use (shared ring only)"""
+        return self.frame_buffer.intact(buffered)
+
+    def render_buffered_frame(self, buffered, display_width=800, detections=None):
+        """
+        render_frame_with_detections for a buffered frame, or None if the
+        frame's slot was overwritten during the render (a torn read)
+        """
+        image = self.render_frame_with_detections(buffered.frame, display_width, detections)
+        return image if self.frame_intact(buffered) else None
+
+    def render_frame_with_detections(self, frame, display_width=800, detections=None):
+        """
+        Resize a captured frame and draw detections on it
+        Uses the latest MQTT detections unless a detections list is given.
+        """
         if frame is None:
             return None
 
         # Overlay detections - same as your original logic
         display_height = int(frame.shape[0] * (display_width / frame.shape[1]))
-        frame_display = imutils.resize(frame, width=display_width)
+        # Draw into a pooled array so the buffered frame is never drawn on
+        frame_display = self.frame_pool.acquire((display_height, display_width) + frame.shape[2:], frame.dtype)
+        if display_width == frame.shape[1]:
+            np.copyto(frame_display, frame)
+        else:
+            cv2.resize(frame, (display_width, display_height), dst=frame_display, interpolation=cv2.INTER_AREA)
 
         # Calculate scaling factors for bounding boxes
         scale_x = display_width / frame.shape[1]
         scale_y = display_height / frame.shape[0]
 
-        with self.detections_lock:
-            current_detections = list(self.latest_detections)  # Get a copy
+        if detections is None:
+            with self.detections_lock:
+                current_detections = list(self.latest_detections)  # Get a copy
+        else:
+            current_detections = detections
 
-        for detection in current_detections:
-            try:
-                # Bounding box coordinates from MQTT are [x, y, w, h]
-                x_orig, y_orig, w_orig, h_orig = detection["box"]
-                name = detection["name"]
-                confidence = detection["confidence"]
-
-                # Scale bounding box coordinates to the display frame size
-                x = int(x_orig * scale_x)
-                y = int(y_orig * scale_y)
-                w = int(w_orig * scale_x)
-                h = int(h_orig * scale_y)
-
-                # Ensure coordinates are within bounds
-                x = max(0, min(x, frame_display.shape[1] - 1))
-                y = max(0, min(y, frame_display.shape[0] - 1))
-                w = max(1, min(w, frame_display.shape[1] - x))
-                h = max(1, min(h, frame_display.shape[0] - y))
-
-                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                cv2.rectangle(frame_display, (x, y), (x + w, y + h), color, 2)
-
-                label = f"{name}"
-                if confidence > 0:
-                    label += f" ({confidence:.0f}%)"
-
-                cv2.putText(frame_display, label, (x, y + h + 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            except Exception as e:
-                logger.error(f"Error drawing detection: {e}")
+        # Repeated detection sets reuse a pre-rendered layer; moving tracked boxes are drawn directly
+        frame_display = self.overlay_renderer.draw(frame_display, current_detections, scale_x, scale_y)
 
         return frame_display
 
@@ -223,6 +426,10 @@ class RTSPMQTTStreamClient:
         try:
             self.is_running = True
 
+            # Start the decode/dispatch worker before messages can arrive
+            self.ingest_thread = threading.Thread(target=self.ingest_loop, daemon=True)
+            self.ingest_thread.start()
+
             # Start MQTT client
             self.mqtt_client = mqtt.Client()
             self.mqtt_client.on_connect = self.on_connect
@@ -231,9 +438,12 @@ class RTSPMQTTStreamClient:
             self.mqtt_client.connect(self.MQTT_BROKER_HOST, self.MQTT_PORT, 60)
             self.mqtt_client.loop_start()  # Start MQTT loop in background
 
-            # Start RTSP reader thread
-            self.rtsp_thread = threading.Thread(target=self.rtsp_reader_loop, daemon=True)
-            self.rtsp_thread.start()
+            if self.DECODE_WORKER_PROCESS:
+                self._start_decode_process()
+            else:
+                # Start RTSP reader thread
+                self.rtsp_thread = threading.Thread(target=self.rtsp_reader_loop, daemon=True)
+                self.rtsp_thread.start()
 
             logger.info("RTSP and MQTT services started successfully")
             return True
@@ -248,6 +458,8 @@ class RTSPMQTTStreamClient:
         logger.info("Stopping RTSP and MQTT services...")
 
         self.is_running = False
+        if self.decode_process is not None:
+            self._stop_decode_process()
 
         # Stop MQTT client
         if self.mqtt_client is not None:
@@ -256,29 +468,50 @@ class RTSPMQTTStreamClient:
             self.mqtt_client = None
             self.mqtt_connected = False
 
+        # Let the ingest worker finish what was already received, then drop the rest
+        if self.ingest_thread is not None:
+            self.ingest_thread.join(timeout=2)
+            self.ingest_thread = None
+        self.ingest_queue.clear()
+
         # Clear detection data
         with self.detections_lock:
             self.latest_detections.clear()
 
-        # Clear frame queue
-        while not self.frame_queue.empty():
-            try:
-                self.frame_queue.get_nowait()
-            except queue.Empty:
-                break
+        # Clear buffered frames and detection history
+        self.frame_buffer.clear()
+        self.detection_aligner.clear()
+        self.tracker.clear()
 
         logger.info("Services stopped successfully")
 
     def get_status(self):
         """Get current service status"""
+        # The decode worker counts in shared memory; the reader thread counts here
+        decode_counters = self.frame_buffer if self.DECODE_WORKER_PROCESS else self
         return {
+            "camera_id": self.CAMERA_ID,
             "is_running": self.is_running,
             "mqtt_connected": self.mqtt_connected,
             "rtsp_url": self.JETSON_RTSP_URL,
+            "frame_source": self.frame_source.describe(),
             "mqtt_broker": f"{self.MQTT_BROKER_HOST}:{self.MQTT_PORT}",
             "mqtt_topic": self.MQTT_TOPIC,
             "active_detections": len(self.latest_detections),
-            "frame_queue_size": self.frame_queue.qsize()
+            "frame_queue_size": len(self.frame_buffer),
+            "latest_frame_seq": self.frame_buffer.latest_seq,
+            "decode_mode": "process" if self.DECODE_WORKER_PROCESS else "thread",
+            "frames_grabbed": decode_counters.frames_grabbed,
+            "frames_decoded": decode_counters.frames_decoded,
+            "decode_process_pid": self.decode_process.pid if self.decode_process is not None else None,
+            "decodes_throttled": self.decodes_throttled,
+            "max_decode_fps": self.MAX_DECODE_FPS,
+            "alignment": self.detection_aligner.get_stats(),
+            "tracking": self.tracker.get_stats() if self.TRACKING_ENABLED else None,
+            "mqtt_payloads": self.payload_stats.get_stats(),
+            "mqtt_ingest": self.ingest_queue.get_stats(),
+            "overlay": self.overlay_renderer.get_stats(),
+            "frame_pool": self.frame_pool.get_stats()
         }
 
     def get_latest_detections(self):
@@ -294,8 +527,8 @@ class RTSPMQTTStreamClient:
 
 
 def main():
-    """Original main function for standalone execution"""
-    stream_client = RTSPMQTTStreamClient()
+    """Original main function for standalone execution (optional argument: frame source spec)"""
+    stream_client = RTSPMQTTStreamClient(frame_source=sys.argv[1] if len(sys.argv) > 1 else None)
 
     try:
         # Start services
@@ -305,13 +538,19 @@ def main():
 
         print("Starting display loop. Press 'q' to quit.")
 
+        last_seq = 0
         while True:
             try:
-                frame_display = stream_client.get_latest_frame_with_detections(display_width=1200)
+                buffered = stream_client.wait_for_frame(after_seq=last_seq, timeout=0.05)
 
-                if frame_display is not None:
+                if buffered is not None:
+                    last_seq = buffered.seq
+                    frame_display = stream_client.render_buffered_frame(
+                        buffered, display_width=1200, detections=stream_client.get_frame_detections(buffered)
+                    )
                     # Display the frame - same as your original
-                    cv2.imshow('Processed RTSP Stream (Edge Server)', frame_display)
+                    if frame_display is not None:
+                        cv2.imshow('Processed RTSP Stream (Edge Server)', frame_display)
 
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
@@ -0,0 +1,181 @@
+import cv2
+import numpy as np
+import logging
+
+from change_detection import detections_signature
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 0.6
+LINE_THICKNESS = 2
+KNOWN_COLOR = (0, 255, 0)
+UNKNOWN_COLOR = (0, 0, 255)
+
+
+class LabelSpriteCache:
+    """Rasterised label text, rendered once per (text, colour) and reused"""
+
+    def __init__(self, max_size=256):
+        self._cache = LRUCache(max_size)
+
+    def get(self, text, color):
+        """Return (pixels, mask, origin) for a label; origin is the text origin inside the sprite"""
+        key = (text, color)
+        sprite = self._cache.get(key)
+        if sprite is None:
+            sprite = self._render(text, color)
+            self._cache.put(key, sprite)
+        return sprite
+
+    @staticmethod
+    def _render(text, color):
+        (text_w, text_h), baseline = cv2.getTextSize(text, LABEL_FONT, LABEL_FONT_SCALE, LINE_THICKNESS)
+        # Pad on every side: thick strokes spill past the nominal text box
+        pad = 2 * LINE_THICKNESS
+        height = text_h + baseline + 2 * pad
+        width = text_w + 2 * pad
+        origin = (pad, text_h + pad)
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.putText(mask, text, origin, LABEL_FONT, LABEL_FONT_SCALE, 255, LINE_THICKNESS)
+        pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        pixels[mask > 0] = color
+        return pixels, mask > 0, origin
+
+    def get_stats(self):
+        return {"sprites": len(self._cache), "hits": self._cache.hits, "misses": self._cache.misses}
+
+
+class OverlayLayer:
+    """
+    Pre-rendered detection overlay for one frame size, stored sparsely as the
+    flat indices of covered pixels and their colours, so compositing is a
+    single vectorised scatter whatever the number of detections.
+    """
+
+    def __init__(self, indices, values):
+        self.indices = indices
+        self.values = values
+
+    def apply(self, frame):
+        """Composite the overlay onto a BGR frame (in place when contiguous) and return it"""
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        if self.indices.size:
+            frame.reshape(-1, 3)[self.indices] = self.values
+        return frame
+
+
+class OverlayRenderer:
+    """
+    Draws detection boxes and cached label sprites onto frames. A detection
+    set drawn again at the same frame size (static detections, every viewer
+    of a frame) gets an OverlayLayer built once and reused until the
+    detections change. Detections that move every frame (tracked boxes moved
+    to each frame's time) never repeat, so they are drawn straight onto the
+    frame instead of building a full-frame layer nobody reuses.
+    """
+
+    def __init__(self, max_layers=16, max_sprites=256):
+        self.labels = LabelSpriteCache(max_sprites)
+        self._layers = LRUCache(max_layers)
+        self._seen = LRUCache(max_layers * 4)  # Layer keys drawn once, built into a layer on their next use
+        self.layers_built = 0
+        self.direct_draws = 0
+
+    def draw(self, frame, detections, scale_x, scale_y):
+        """Overlay detections on a BGR frame (in place when contiguous) and return it"""
+        height, width = frame.shape[:2]
+        key = (detections_signature(detections), width, height, round(scale_x, 6), round(scale_y, 6))
+        layer = self._layers.get(key)
+        if layer is None:
+            if self._seen.get(key) is None:
+                self._seen.put(key, True)
+                self.direct_draws += 1
+                if not frame.flags['C_CONTIGUOUS']:
+                    frame = np.ascontiguousarray(frame)
+                self._draw(frame, None, detections, width, height, scale_x, scale_y)
+                return frame
+            layer = self._build(detections, width, height, scale_x, scale_y)
+            self._layers.put(key, layer)
+        return layer.apply(frame)
+
+    def get_layer(self, detections, frame_shape, scale_x, scale_y) -> OverlayLayer:
+        """Overlay for these detections on a frame of frame_shape, built on first use"""
+        height, width = frame_shape[:2]
+        key = (detections_signature(detections), width, height, round(scale_x, 6), round(scale_y, 6))
+        layer = self._layers.get(key)
+        if layer is None:
+            layer = self._build(detections, width, height, scale_x, scale_y)
+            self._layers.put(key, layer)
+        return layer
+
+    def _build(self, detections, width, height, scale_x, scale_y) -> OverlayLayer:
+        self.layers_built += 1
+        pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        self._draw(pixels, mask, detections, width, height, scale_x, scale_y)
+        indices = np.flatnonzero(mask)
+        return OverlayLayer(indices, pixels.reshape(-1, 3)[indices])
+
+    def _draw(self, pixels, mask, detections, width, height, scale_x, scale_y):
+        """Draw boxes and labels into pixels, marking covered pixels in mask unless it is None"""
+        for detection in detections:
+            try:
+                # Bounding box coordinates from MQTT are [x, y, w, h]
+                x_orig, y_orig, w_orig, h_orig = detection["box"]
+                name = detection["name"]
+                confidence = detection["confidence"]
+
+                # Scale bounding box coordinates to the display frame size
+                x = int(x_orig * scale_x)
+                y = int(y_orig * scale_y)
+                w = int(w_orig * scale_x)
+                h = int(h_orig * scale_y)
+
+                # Ensure coordinates are within bounds
+                x = max(0, min(x, width - 1))
+                y = max(0, min(y, height - 1))
+                w = max(1, min(w, width - x))
+                h = max(1, min(h, height - y))
+
+                color = KNOWN_COLOR if name != "Unknown" else UNKNOWN_COLOR
+                cv2.rectangle(pixels, (x, y), (x + w, y + h), color, LINE_THICKNESS)
+                if mask is not None:
+                    cv2.rectangle(mask, (x, y), (x + w, y + h), 255, LINE_THICKNESS)
+
+                label = f"{name}"
+                if confidence > 0:
+                    label += f" ({confidence:.0f}%)"
+                self._blit_label(pixels, mask, label, color, x, y + h + 20)
+            except Exception as e:
+                logger.error(f"Error drawing detection: {e}")
+
+    def _blit_label(self, pixels, mask, text, color, origin_x, origin_y):
+        """Copy a cached label sprite as cv2.putText would draw it at the origin, clipped to the frame"""
+        sprite, sprite_mask, (sprite_x, sprite_y) = self.labels.get(text, color)
+        top = origin_y - sprite_y
+        x = origin_x - sprite_x
+        sprite_h, sprite_w = sprite_mask.shape
+
+        # Clip the sprite rectangle against the frame
+        y0, x0 = max(0, top), max(0, x)
+        y1, x1 = min(pixels.shape[0], top + sprite_h), min(pixels.shape[1], x + sprite_w)
+        if y0 >= y1 or x0 >= x1:
+            return
+
+        sub_mask = sprite_mask[y0 - top:y1 - top, x0 - x:x1 - x]
+        pixels[y0:y1, x0:x1][sub_mask] = sprite[y0 - top:y1 - top, x0 - x:x1 - x][sub_mask]
+        if mask is not None:
+            mask[y0:y1, x0:x1][sub_mask] = 255
+
+    def get_stats(self):
+        """Get overlay cache counters for status endpoints"""
+        return {
+            "layers_built": self.layers_built,
+            "direct_draws": self.direct_draws,
+            "layers_cached": len(self._layers),
+            "labels": self.labels.get_stats()
+        }
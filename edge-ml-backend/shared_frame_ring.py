@@ -0,0 +1,326 @@
+import cv2
+import multiprocessing
+import threading
+import time
+import weakref
+import logging
+from multiprocessing import shared_memory
+from typing import Optional, List
+
+import numpy as np
+
+from frame_buffer import BufferedFrame
+from frame_sources import make_frame_source
+
+logger = logging.getLogger(__name__)
+
+# Control words at the start of the shared block (int64)
+CONTROL_SEQ = 0  # Sequence number of the newest published frame
+CONTROL_DEMAND_SEQ = 1  # A reader wants a frame newer than this
+CONTROL_HISTORY_FPS = 2  # Decode rate (x1000) wanted for frame history, 0 = none
+CONTROL_RTSP_CONNECTED = 3
+CONTROL_FRAMES_GRABBED = 4
+CONTROL_FRAMES_DECODED = 5
+CONTROL_STOP = 6
+CONTROL_CAPACITY = 7
+CONTROL_MAX_HEIGHT = 8
+CONTROL_MAX_WIDTH = 9
+CONTROL_WORDS = 16
+
+# Per-slot metadata (float64): seq (-1 while being written), timestamp, height, width
+SLOT_META_WORDS = 4
+
+
+class SharedFrameRing:
+    """
+    Frame ring in multiprocessing shared memory, filled by a decode worker
+    process and read by the API process. Frames are handed over without
+    pickling: the worker copies each decoded frame into a fixed-size slot and
+    readers get NumPy views straight into that slot. A view stays valid until
+    its slot is reused capacity frames later, so readers check intact() after
+    using one (seqlock-style) and discard their result if the slot was
+    overwritten meanwhile; keep a copy for longer use.
+
+    The worker sets a multiprocessing Event after every published frame and
+    RTSP state change, which wakes the reader-side watcher thread.
+
+    Implements the FrameRingBuffer interface so the stream client, the
+    broadcasters and the detection aligner work with either.
+    """
+
+    def __init__(self, capacity=30, max_width=1280, max_height=720, name=None, notify=None, status_interval=1.0):
+        self.owner = name is None
+        if self.owner:
+            size = (CONTROL_WORDS * 8 + capacity * SLOT_META_WORDS * 8
+                    + capacity * max_height * max_width * 3)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+        self._control = np.ndarray((CONTROL_WORDS,), dtype=np.int64, buffer=self._shm.buf)
+        if self.owner:
+            self._control[:] = 0
+            self._control[CONTROL_CAPACITY] = capacity
+            self._control[CONTROL_MAX_HEIGHT] = max_height
+            self._control[CONTROL_MAX_WIDTH] = max_width
+        self.capacity = int(self._control[CONTROL_CAPACITY])
+        self.max_height = int(self._control[CONTROL_MAX_HEIGHT])
+        self.max_width = int(self._control[CONTROL_MAX_WIDTH])
+
+        meta_offset = CONTROL_WORDS * 8
+        pixels_offset = meta_offset + self.capacity * SLOT_META_WORDS * 8
+        self._meta = np.ndarray((self.capacity, SLOT_META_WORDS), dtype=np.float64,
+                                buffer=self._shm.buf, offset=meta_offset)
+        self._pixels = np.ndarray((self.capacity, self.max_height, self.max_width, 3), dtype=np.uint8,
+                                  buffer=self._shm.buf, offset=pixels_offset)
+        if self.owner:
+            self._meta[:] = 0
+
+        # Set by the writer on every publish; pass the owner's notify to the worker's ring
+        self.notify = notify if notify is not None else multiprocessing.get_context("spawn").Event()
+
+        # Reader side: a watcher thread turns shared seq changes into local wake-ups
+        self.status_interval = status_interval  # Longest wait between checks without a wake-up
+        self._condition = threading.Condition()
+        self._watcher = None
+        self._watching = False
+        self.on_rtsp_status = None  # Called with True/False when the worker's RTSP state changes
+
+        self._finalizer = weakref.finalize(self, SharedFrameRing._release, self._shm, self.owner)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @staticmethod
+    def _release(shm, owner):
+        shm.close()
+        if owner:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Stop watching and release the shared block (unlinking it if this side created it)"""
+        self.stop_watching()
+        # Drop our views before closing the mapping
+        self._control = self._meta = self._pixels = None
+        self._finalizer()
+
+    # ---- writer (decode worker) ----
+
+    def put(self, frame, timestamp=None) -> int:
+        """Copy a frame into the next slot (downscaling it if it exceeds the slot) and publish it"""
+        seq = int(self._control[CONTROL_SEQ]) + 1
+        slot = seq % self.capacity
+        height, width = frame.shape[:2]
+        if height > self.max_height or width > self.max_width:
+            scale = min(self.max_height / height, self.max_width / width)
+            height, width = max(1, int(height * scale)), max(1, int(width * scale))
+
+        # Invalidate the slot while it is being overwritten
+        self._meta[slot, 0] = -1
+        target = self._pixels[slot, :height, :width]
+        if (height, width) == frame.shape[:2]:
+            np.copyto(target, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=target, interpolation=cv2.INTER_AREA)
+        self._meta[slot, 1] = timestamp if timestamp is not None else time.time()
+        self._meta[slot, 2] = height
+        self._meta[slot, 3] = width
+        self._meta[slot, 0] = seq
+        self._control[CONTROL_SEQ] = seq
+        self._control[CONTROL_FRAMES_DECODED] += 1
+        self.notify.set()
+        return seq
+
+    def has_demand(self) -> bool:
+        """True if some reader is waiting for a frame newer than the latest one"""
+        return self._control[CONTROL_DEMAND_SEQ] >= self._control[CONTROL_SEQ]
+
+    @property
+    def history_fps(self) -> float:
+        return self._control[CONTROL_HISTORY_FPS] / 1000.0
+
+    @history_fps.setter
+    def history_fps(self, fps):
+        self._control[CONTROL_HISTORY_FPS] = int(fps * 1000)
+
+    @property
+    def stop_requested(self) -> bool:
+        return bool(self._control[CONTROL_STOP])
+
+    def request_stop(self, stop=True):
+        self._control[CONTROL_STOP] = int(stop)
+
+    def set_rtsp_connected(self, connected):
+        if self._control[CONTROL_RTSP_CONNECTED] != int(connected):
+            self._control[CONTROL_RTSP_CONNECTED] = int(connected)
+            self.notify.set()
+
+    def count_grab(self):
+        self._control[CONTROL_FRAMES_GRABBED] += 1
+
+    @property
+    def frames_grabbed(self) -> int:
+        return int(self._control[CONTROL_FRAMES_GRABBED])
+
+    @property
+    def frames_decoded(self) -> int:
+        return int(self._control[CONTROL_FRAMES_DECODED])
+
+    # ---- readers (API process) ----
+
+    def start_watching(self):
+        """Start the thread that wakes local waiters when the worker publishes a frame"""
+        if self._watching:
+            return
+        self._watching = True
+        self._watcher = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._watching = False
+        self.notify.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1)
+            self._watcher = None
+
+    def _watch_loop(self):
+        last_seq = self.latest_seq
+        rtsp_connected = bool(self._control[CONTROL_RTSP_CONNECTED])
+        while self._watching:
+            # Block until the worker publishes; clear before reading so no publish is missed
+            self.notify.wait(timeout=self.status_interval)
+            self.notify.clear()
+
+            seq = self.latest_seq
+            if seq != last_seq:
+                last_seq = seq
+                with self._condition:
+                    self._condition.notify_all()
+
+            connected = bool(self._control[CONTROL_RTSP_CONNECTED])
+            if connected != rtsp_connected:
+                rtsp_connected = connected
+                if self.on_rtsp_status is not None:
+                    self.on_rtsp_status(connected)
+
+    def request_newer(self, seq):
+        """Signal that a reader wants a frame newer than seq"""
+        if seq >= self._control[CONTROL_SEQ]:
+            self._control[CONTROL_DEMAND_SEQ] = max(seq, int(self._control[CONTROL_DEMAND_SEQ]))
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest frame (0 if nothing was written yet)"""
+        return int(self._control[CONTROL_SEQ])
+
+    def _entry(self, slot, expected_seq=None) -> Optional[BufferedFrame]:
+        seq, timestamp, height, width = self._meta[slot]
+        if seq <= 0 or (expected_seq is not None and seq != expected_seq):
+            return None
+        return BufferedFrame(seq=int(seq), frame=self._pixels[slot, :int(height), :int(width)], timestamp=timestamp)
+
+    def intact(self, buffered) -> bool:
+        """
+        True if a frame's slot still holds it: check after reading the view, since the
+        worker may have overwritten it in the meantime (the read is then torn)
+        """
+        return self._meta[buffered.seq % self.capacity, 0] == buffered.seq
+
+    def latest(self) -> Optional[BufferedFrame]:
+        """Peek at the newest frame (a view into shared memory) without consuming it"""
+        seq = self.latest_seq
+        if seq == 0:
+            return None
+        return self._entry(seq % self.capacity, expected_seq=seq)
+
+    def get(self, seq) -> Optional[BufferedFrame]:
+        """Return the frame with the given sequence number if it is still buffered"""
+        return self._entry(seq % self.capacity, expected_seq=seq)
+
+    def snapshot(self) -> List[BufferedFrame]:
+        """All buffered frames, oldest first"""
+        entries = (self._entry(slot) for slot in range(self.capacity))
+        return sorted((entry for entry in entries if entry is not None), key=lambda e: e.seq)
+
+    def wait_for_newer(self, seq, timeout=None) -> Optional[BufferedFrame]:
+        """Block until a frame newer than seq exists and return the newest one, or None on timeout"""
+        self.request_newer(seq)
+        with self._condition:
+            self._condition.wait_for(lambda: self.latest_seq > seq, timeout=timeout)
+        if self.latest_seq > seq:
+            return self.latest()
+        return None
+
+    def clear(self):
+        """Drop all buffered frames (sequence numbers keep increasing)"""
+        self._meta[:, 0] = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self._meta[:, 0] > 0))
+
+
+def decode_worker(ring_name, frame_source, max_decode_fps=None, notify=None):
+    """
+    Entry point of the decode worker process: grab every source frame, decode
+    only those a reader asked for (or that frame history needs), and publish
+    them into the shared ring until the API process requests a stop.
+    """
+    logging.basicConfig(level=logging.INFO)
+    ring = SharedFrameRing(name=ring_name, notify=notify)
+    frame_source = make_frame_source(frame_source)
+    cap = None
+    scratch = None  # Decode target reused for every frame before the copy into the ring
+    last_decoded_at = 0.0
+    try:
+        while not ring.stop_requested:
+            try:
+                if cap is None or not cap.isOpened():
+                    logger.info(f"Attempting to open frame source: {frame_source.describe()}")
+                    cap = frame_source.open()
+                    if not cap.isOpened():
+                        logger.warning("Failed to open frame source. Retrying in 5 seconds...")
+                        time.sleep(5)
+                        continue
+                    ring.set_rtsp_connected(True)
+                    logger.info("Frame source opened successfully.")
+
+                if not cap.grab():
+                    logger.warning("Failed to read frame from frame source. Re-initializing capture...")
+                    cap.release()
+                    cap = None
+                    ring.set_rtsp_connected(False)
+                    continue
+
+                grabbed_at = time.time()
+                ring.count_grab()
+                history_fps = ring.history_fps
+                history_due = history_fps > 0 and grabbed_at - last_decoded_at >= 1.0 / history_fps
+                rate_ok = not max_decode_fps or grabbed_at - last_decoded_at >= 1.0 / max_decode_fps
+
+                if (ring.has_demand() or history_due) and rate_ok:
+                    ret, frame = cap.retrieve(image=scratch)
+                    if ret:
+                        scratch = frame
+                        last_decoded_at = grabbed_at
+                        ring.put(frame, timestamp=grabbed_at)
+
+                if frame_source.idle_sleep:
+                    time.sleep(frame_source.idle_sleep)
+
+            except Exception as e:
+                logger.error(f"Error in decode worker: {e}")
+                if cap is not None:
+                    cap.release()
+                cap = None
+                ring.set_rtsp_connected(False)
+                time.sleep(5)
+    finally:
+        if cap is not None:
+            cap.release()
+        ring.set_rtsp_connected(False)
+        ring.close()
+        logger.info("Decode worker stopped")
@@ -0,0 +1,568 @@
+import asyncio
+import collections
+import cv2
+import json
+import numpy as np
+import struct
+import threading
+import time
+import logging
+from typing import NamedTuple, Optional
+
+from change_detection import detections_signature
+from image_encoders import get_encoder
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Binary WebSocket video message header: frame seq (u64), capture timestamp (f64),
+# metadata length (u32); followed by the JSON metadata and then the encoded image bytes
+WS_FRAME_HEADER = struct.Struct("<QdI")
+
+
+class EncodedFrame(NamedTuple):
+    """A rendered frame, encoded once and shared read-only by every viewer"""
+    seq: int
+    data: bytes
+    part: bytes  # Ready-to-send multipart/x-mixed-replace chunk
+    timestamp: float
+    content_type: str = "image/jpeg"
+
+
+class ViewerProfile(NamedTuple):
+    """What one viewer is currently asking the broadcaster for"""
+    render_width: Optional[int]  # Rendition width; None renders at native resolution
+    scale: float  # Adaptive downscale applied to the rendition before encoding
+    jpeg_quality: int  # Encoder quality (1-100), named for the default JPEG encoder
+    fps: float
+    encoder: str = "jpeg"  # image_encoders name: jpeg, turbojpeg, webp, png
+
+    @property
+    def variant_key(self):
+        """What the encoded bytes depend on (fps only affects pacing)"""
+        return self.render_width, self.scale, self.jpeg_quality, self.encoder
+
+
+def build_mjpeg_part(image_bytes, content_type="image/jpeg"):
+    """Wrap encoded image bytes in a multipart/x-mixed-replace chunk"""
+    return (b'--frame\r\n'
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + image_bytes + b'\r\n')
+
+
+def build_ws_message(seq, timestamp, metadata, image_bytes):
+    """Pack a frame and its metadata (detections, box scale) into one binary WebSocket message"""
+    metadata_bytes = json.dumps(metadata, separators=(",", ":")).encode()
+    return WS_FRAME_HEADER.pack(seq, timestamp, len(metadata_bytes)) + metadata_bytes + image_bytes
+
+
+class RenderedFrame:
+    """
+    One captured frame plus every rendition and encoded variant requested for it.
+    Each rendition (overlay drawn at a given width) and each encoded
+    (rendition, scale, quality, encoder) variant is computed at most once, however many
+    viewers ask for it; the caches live only as long as this frame is latest.
+    """
+
+    def __init__(self, seq, timestamp, source_width, render_fn, detections=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.source_width = source_width
+        self.detections = detections if detections is not None else []
+        self._render_fn = render_fn  # render width (None = native) -> overlaid image
+        self._renditions = {}
+        self._variants = {}
+        self._messages = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _compute_once(self, cache, key, compute_fn):
+        """Return cache[key], computing it once even under concurrent requests"""
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault((id(cache), key), threading.Lock())
+
+        # Concurrent requests for the same key wait for the first caller
+        with key_lock:
+            cached = cache.get(key)
+            if cached is None:
+                cached = compute_fn()
+                if cached is not None:
+                    cache[key] = cached
+            return cached
+
+    def get_image(self, render_width=None):
+        """Overlay-rendered image at render_width, rendered on first use"""
+        return self._compute_once(self._renditions, render_width,
+                                  lambda: self._render_fn(render_width))
+
+    def get_cached(self, profile: ViewerProfile) -> Optional[EncodedFrame]:
+        """Return an already-encoded variant without doing any work"""
+        return self._variants.get(profile.variant_key)
+
+    def get_variant(self, profile: ViewerProfile, encode_fn) -> Optional[EncodedFrame]:
+        """Return the variant for a viewer profile, rendering/encoding it on first use"""
+        def compute():
+            image = self.get_image(profile.render_width)
+            if image is None:
+                return None
+            image_bytes = encode_fn(image, profile.scale, profile.jpeg_quality, profile.encoder)
+            if image_bytes is None:
+                return None
+            content_type = get_encoder(profile.encoder).content_type
+            return EncodedFrame(
+                seq=self.seq,
+                data=image_bytes,
+                part=build_mjpeg_part(image_bytes, content_type),
+                timestamp=self.timestamp,
+                content_type=content_type
+            )
+
+        return self._compute_once(self._variants, profile.variant_key, compute)
+
+    def get_cached_message(self, profile: ViewerProfile) -> Optional[bytes]:
+        """Return an already-built WebSocket message without doing any work"""
+        return self._messages.get(profile.variant_key)
+
+    def get_message(self, profile: ViewerProfile, encode_fn) -> Optional[bytes]:
+        """
+        Binary WebSocket message for a viewer profile: the encoded variant plus
+        the detections for this frame, built once and shared by every subscriber.
+        """
+        def compute():
+            encoded = self.get_variant(profile, encode_fn)
+            if encoded is None:
+                return None
+            render_width = profile.render_width or self.source_width
+            metadata = {
+                "seq": self.seq,
+                "timestamp": self.timestamp,
+                "content_type": encoded.content_type,
+                "detections": self.detections,
+                # Multiply detection boxes (camera pixels) by this to get image pixels
+                "box_scale": render_width / self.source_width * profile.scale
+            }
+            return build_ws_message(self.seq, self.timestamp, metadata, encoded.data)
+
+        return self._compute_once(self._messages, profile.variant_key, compute)
+
+
+class MJPEGBroadcaster:
+    """
+    Single render/encode stage shared by all /api/stream/video viewers.
+    One background thread waits on the stream client's frame buffer and
+    publishes each new frame as a RenderedFrame, pre-rendering and encoding
+    the variant every connected viewer profile needs. Viewers then only write
+    the shared encoded bytes to their socket.
+
+    In "delayed" sync mode the broadcaster shows video held back by the
+    measured detection latency, with each frame drawn using the detections
+    inferred from (or closest to) that frame.
+
+    With draw_overlay=False frames are published clean, carrying their
+    detections alongside, and the binary WebSocket message of every profile
+    is pre-built so clients draw the boxes themselves.
+
+    encoder is the default image encoder (see image_encoders); viewers may
+    ask for another one through their ViewerProfile.
+    """
+
+    def __init__(self, stream_client, display_width=800, jpeg_quality=85, target_fps=3.0, max_viewers=None,
+                 change_detector=None, sync_mode="live", draw_overlay=True, encoder="jpeg"):
+        if sync_mode not in ("live", "delayed"):
+            raise ValueError(f"Unknown sync mode: {sync_mode}")
+        get_encoder(encoder)  # Fail fast on an unknown or unavailable encoder
+        self.stream_client = stream_client
+        self.change_detector = change_detector  # Optional FrameChangeDetector
+        self.sync_mode = sync_mode  # "live": newest frame; "delayed": frame matching detections
+        self.display_width = display_width
+        self.jpeg_quality = jpeg_quality
+        self.target_fps = target_fps
+        self.max_viewers = max_viewers  # None means unlimited
+        self.draw_overlay = draw_overlay  # False: clients draw detections from WebSocket metadata
+        self.encoder = encoder
+
+        # Latest published frame, guarded by the condition
+        self._condition = threading.Condition()
+        self._latest = None
+        self._seq = 0
+        self._async_waiters = set()  # (event loop, asyncio.Event) pairs
+
+        # Control variables
+        self._thread = None
+        self._stop_event = None
+        self._viewer_count = 0
+        self._viewer_profiles = collections.Counter()  # ViewerProfile -> number of viewers on it
+
+        # Counters
+        self.frames_rendered = 0
+        self.frames_encoded = 0
+        self.bytes_encoded = 0
+        self.encoder_stats = collections.defaultdict(lambda: {"frames": 0, "bytes": 0, "seconds": 0.0})
+
+    @property
+    def default_profile(self) -> ViewerProfile:
+        return ViewerProfile(self.display_width, 1.0, self.jpeg_quality, self.target_fps, self.encoder)
+
+    def add_viewer(self):
+        """
+        Register a viewer, starting the broadcast thread on the first one.
+        Returns False if max_viewers sessions are already active.
+        """
+        with self._condition:
+            if self.max_viewers is not None and self._viewer_count >= self.max_viewers:
+                return False
+            self._viewer_count += 1
+            if not self._running:
+                # Each thread gets its own stop event so a thread that is still
+                # winding down can never be revived by a new viewer
+                self._stop_event = threading.Event()
+                if self.change_detector is not None:
+                    self.change_detector.reset()
+                self._thread = threading.Thread(target=self._broadcast_loop,
+                                                args=(self._stop_event,), daemon=True)
+                self._thread.start()
+                logger.info(f"MJPEG broadcaster started ({self.sync_mode})")
+            return True
+
+    def remove_viewer(self):
+        """Unregister a viewer, stopping the broadcast thread after the last one"""
+        with self._condition:
+            self._viewer_count = max(0, self._viewer_count - 1)
+            if self._viewer_count == 0 and self._running:
+                self._stop_event.set()
+                self._condition.notify_all()
+                logger.info(f"MJPEG broadcaster stopped ({self.sync_mode}, no viewers)")
+
+    def update_viewer_profile(self, old_profile=None, new_profile=None):
+        """
+        Record that a viewer moved between profiles. The broadcast thread
+        renders at the fastest profile in use and pre-encodes every profile's
+        variant, so viewers never encode on the event loop's critical path.
+        """
+        with self._condition:
+            if old_profile is not None:
+                self._viewer_profiles[old_profile] -= 1
+                if self._viewer_profiles[old_profile] <= 0:
+                    del self._viewer_profiles[old_profile]
+            if new_profile is not None:
+                self._viewer_profiles[new_profile] += 1
+
+    def _render_interval(self):
+        """Seconds between published frames: fastest viewer profile, capped at target_fps"""
+        with self._condition:
+            fps = max((profile.fps for profile in self._viewer_profiles), default=self.target_fps)
+        fps = min(fps, self.target_fps)
+        return 1.0 / fps if fps > 0 else 0
+
+    def stop(self):
+        """Stop the broadcast thread regardless of connected viewers"""
+        with self._condition:
+            if self._stop_event is not None:
+                self._stop_event.set()
+            self._viewer_count = 0
+            self._viewer_profiles.clear()
+            self._latest = None
+            self._condition.notify_all()
+
+    @property
+    def viewer_count(self):
+        with self._condition:
+            return self._viewer_count
+
+    @property
+    def _running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0) -> Optional[RenderedFrame]:
+        """Block until a frame newer than after_seq is published, or timeout"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._latest is not None and self._latest.seq > after_seq,
+                timeout=timeout
+            )
+            if self._latest is not None and self._latest.seq > after_seq:
+                return self._latest
+            return None
+
+    async def wait_for_frame_async(self, after_seq=0, timeout=1.0) -> Optional[RenderedFrame]:
+        """
+        Await a frame newer than after_seq without tying up a worker thread.
+        The broadcast thread wakes the waiter via call_soon_threadsafe.
+        """
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+
+        with self._condition:
+            if self._latest is not None and self._latest.seq > after_seq:
+                return self._latest
+            self._async_waiters.add(waiter)
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+        latest = self.get_latest_frame()
+        if latest is not None and latest.seq > after_seq:
+            return latest
+        return None
+
+    def get_latest_frame(self) -> Optional[RenderedFrame]:
+        """Return the most recently published frame without waiting"""
+        with self._condition:
+            return self._latest
+
+    @property
+    def latest_seq(self):
+        """Sequence number of the newest published frame"""
+        with self._condition:
+            return self._seq
+
+    def encode_variant(self, rendered, profile: Optional[ViewerProfile] = None) -> Optional[EncodedFrame]:
+        """Get (rendering/encoding once if needed) the variant of a frame for a viewer profile"""
+        return rendered.get_variant(profile or self.default_profile, self._encode)
+
+    def build_message(self, rendered, profile: Optional[ViewerProfile] = None) -> Optional[bytes]:
+        """Get (building once if needed) the binary WebSocket message of a frame for a viewer profile"""
+        return rendered.get_message(profile or self.default_profile, self._encode)
+
+    def _publish(self, timestamp, source_width, render_fn, detections=None):
+        """Publish a new latest frame, pre-encoding the variant of every active profile"""
+        with self._condition:
+            seq = self._seq + 1
+            profiles = list(self._viewer_profiles) or [self.default_profile]
+
+        rendered = RenderedFrame(seq=seq, timestamp=timestamp, source_width=source_width, render_fn=render_fn,
+                                 detections=detections)
+        if self.draw_overlay:
+            encoded = [self.encode_variant(rendered, profile) for profile in profiles]
+        else:
+            encoded = [self.build_message(rendered, profile) for profile in profiles]
+        if all(variant is None for variant in encoded):
+            return
+
+        with self._condition:
+            self._seq = seq
+            self._latest = rendered
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop already closed; the waiter is discarded by its own finally
+                pass
+
+    def _render(self, buffered, detections, render_width):
+        """Draw the detection overlay on a buffered frame at render_width (None = native; None if torn)"""
+        self.frames_rendered += 1
+        return self.stream_client.render_buffered_frame(
+            buffered, display_width=render_width or buffered.frame.shape[1],
+            detections=detections if self.draw_overlay else []
+        )
+
+    def _encode(self, image, scale, quality, encoder="jpeg"):
+        """Downscale (if needed) and encode a rendered image, returning immutable bytes"""
+        if scale < 1.0:
+            width = max(1, int(image.shape[1] * scale))
+            height = max(1, int(image.shape[0] * scale))
+            scaled = self.stream_client.frame_pool.acquire((height, width) + image.shape[2:], image.dtype)
+            image = cv2.resize(image, (width, height), dst=scaled, interpolation=cv2.INTER_AREA)
+
+        started = time.perf_counter()
+        image_bytes = get_encoder(encoder).encode(image, quality)
+        if image_bytes is None:
+            return None
+        stats = self.encoder_stats[encoder]
+        stats["frames"] += 1
+        stats["bytes"] += len(image_bytes)
+        stats["seconds"] += time.perf_counter() - started
+        self.frames_encoded += 1
+        self.bytes_encoded += len(image_bytes)
+        return image_bytes
+
+    def _placeholder_frame(self, render_width=None):
+        """Black 'No RTSP Stream' frame shown until the first real frame arrives"""
+        width = render_width or self.display_width
+        height = int(width * 9 / 16)
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        font_scale = width / 800
+        cv2.putText(frame, "No RTSP Stream", (int(width * 0.31), height // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), max(1, int(2 * font_scale)))
+        return frame
+
+    def _next_frame(self, last_seq):
+        """
+        Pick the next frame to publish and the detections to draw on it:
+        (BufferedFrame, detections), or None if there is nothing new.
+        """
+        if self.sync_mode == "delayed":
+            # Video held back so it lines up with late-arriving detections
+            selected = self.stream_client.get_delayed_frame()
+            if selected is None or selected[0].seq == last_seq:
+                return None
+            return selected
+
+        # Wake on the next captured frame instead of polling the client
+        buffered = self.stream_client.wait_for_frame(after_seq=last_seq, timeout=1.0)
+        if buffered is None:
+            return None
+        # Snapshot detections once so every rendition shows the same boxes
+        return buffered, self.stream_client.get_frame_detections(buffered)
+
+    def _broadcast_loop(self, stop_event):
+        """Publish frames at up to target_fps while viewers are connected"""
+        last_seq = 0
+        if self.sync_mode == "delayed":
+            self.stream_client.acquire_frame_history()
+
+        try:
+            while not stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    selected = self._next_frame(last_seq)
+
+                    if selected is not None:
+                        buffered, detections = selected
+                        last_seq = buffered.seq
+                        frame = buffered.frame
+                        # Static scene: skip publishing so viewers keep the previous encoded frame
+                        changed = (self.change_detector is None
+                                   or self.get_latest_frame() is None
+                                   or self.change_detector.has_changed(frame, detections))
+                        if changed:
+                            self._publish(
+                                buffered.timestamp, frame.shape[1],
+                                lambda width, buffered=buffered, detections=detections: self._render(
+                                    buffered, detections, width),
+                                detections=detections
+                            )
+                    elif self.get_latest_frame() is None:
+                        # Nothing captured yet: show a placeholder so viewers get an image
+                        self._publish(time.time(), self.display_width, self._placeholder_frame)
+
+                except Exception as e:
+                    logger.error(f"Error in MJPEG broadcast loop: {e}")
+                    stop_event.wait(0.1)
+
+                interval = self._render_interval()
+                elapsed = time.monotonic() - started
+                if interval > elapsed:
+                    stop_event.wait(interval - elapsed)
+        finally:
+            if self.sync_mode == "delayed":
+                self.stream_client.release_frame_history()
+
+        logger.info(f"MJPEG broadcast loop stopped ({self.sync_mode})")
+
+    def get_stats(self):
+        """Get broadcaster counters for status endpoints"""
+        with self._condition:
+            viewer_profiles = dict(self._viewer_profiles)
+        return {
+            "running": self._running,
+            "sync_mode": self.sync_mode,
+            "draw_overlay": self.draw_overlay,
+            "viewers": self._viewer_count,
+            "max_viewers": self.max_viewers,
+            "viewer_profiles": [
+                {
+                    "render_width": profile.render_width,
+                    "scale": profile.scale,
+                    "jpeg_quality": profile.jpeg_quality,
+                    "fps": profile.fps,
+                    "encoder": profile.encoder,
+                    "viewers": count
+                }
+                for profile, count in viewer_profiles.items()
+            ],
+            "frames_rendered": self.frames_rendered,
+            "frames_encoded": self.frames_encoded,
+            "bytes_encoded": self.bytes_encoded,
+            "encoders": {
+                name: {
+                    "frames": stats["frames"],
+                    "mean_bytes": stats["bytes"] // max(1, stats["frames"]),
+                    "mean_encode_ms": round(stats["seconds"] * 1000 / max(1, stats["frames"]), 2)
+                }
+                for name, stats in list(self.encoder_stats.items())
+            },
+            "change_detector": self.change_detector.get_stats() if self.change_detector is not None else None,
+            "latest_seq": self.latest_seq,
+            "display_width": self.display_width,
+            "jpeg_quality": self.jpeg_quality,
+            "encoder": self.encoder,
+            "target_fps": self.target_fps
+        }
+
+
+class SnapshotCache:
+    """
+    Still images of the latest frame for pollers (/api/stream/snapshot).
+    A new frame is only decoded once the newest buffered one is older than
+    max_age, and each (frame seq, detections, width, encoder) snapshot is
+    encoded at most once, so frequent polling costs neither decodes nor
+    encodes, yet a detection update on an unchanged frame is still drawn.
+    """
+
+    def __init__(self, stream_client, jpeg_quality=85, max_age=1.0, max_entries=8, encoder="jpeg"):
+        get_encoder(encoder)
+        self.stream_client = stream_client
+        self.jpeg_quality = jpeg_quality
+        self.encoder = encoder  # Default encoder; get_image() may ask for another
+        self.max_age = max_age
+        self._cache = LRUCache(max_entries)
+        self._encode_lock = threading.Lock()
+
+        # Counters
+        self.snapshots_encoded = 0
+
+    def latest_frame(self, timeout=0.5):
+        """Newest buffered frame, waiting briefly for a fresh decode if it is stale"""
+        buffered = self.stream_client.frame_buffer.latest()
+        if buffered is None or time.time() - buffered.timestamp > self.max_age:
+            fresh = self.stream_client.wait_for_frame(after_seq=buffered.seq if buffered else 0, timeout=timeout)
+            buffered = fresh or buffered
+        return buffered
+
+    def get_image(self, buffered, render_width=None, encoder=None, detections=None) -> Optional[bytes]:
+        """
+        Encoded image of a buffered frame with detections drawn (by default
+        the ones for the frame's capture time), encoded on first request
+        """
+        encoder = encoder or self.encoder
+        if detections is None:
+            detections = self.stream_client.get_frame_detections(buffered)
+        key = (buffered.seq, detections_signature(detections), render_width, encoder)
+        # Concurrent pollers of the same frame wait for one encode
+        with self._encode_lock:
+            image_bytes = self._cache.get(key)
+            if image_bytes is None:
+                image = self.stream_client.render_buffered_frame(
+                    buffered, display_width=render_width or buffered.frame.shape[1], detections=detections
+                )
+                if image is None:
+                    return None  # Frame overwritten while rendering
+                image_bytes = get_encoder(encoder).encode(image, self.jpeg_quality)
+                if image_bytes is None:
+                    return None
+                self._cache.put(key, image_bytes)
+                self.snapshots_encoded += 1
+            return image_bytes
+
+    def get_stats(self):
+        """Get snapshot cache counters for status endpoints"""
+        return {
+            "snapshots_encoded": self.snapshots_encoded,
+            "cache_hits": self._cache.hits,
+            "cache_misses": self._cache.misses,
+            "max_age": self.max_age,
+            "encoder": self.encoder
+        }
@@ -0,0 +1,14 @@
+from detection_delta import DetectionDeltaEncoder
+
+
+def test_snapshot_carries_the_last_message_timestamp():
+    encoder = DetectionDeltaEncoder(resync_interval=0)
+    assert encoder.snapshot()["timestamp"] == ""
+
+    encoder.update([{"person_id": "p1", "box": [0, 0, 10, 10], "name": "A"}], "2025-07-07T19:56:14.855707")
+    snapshot = encoder.snapshot()
+    assert snapshot["timestamp"] == "2025-07-07T19:56:14.855707"
+    assert list(snapshot["detections"]) == ["p1"]
+
+    encoder.clear()
+    assert encoder.snapshot()["timestamp"] == ""
@@ -0,0 +1,21 @@
+import asyncio
+
+from detection_hub import DetectionHub
+
+
+def test_drops_of_disconnected_subscribers_stay_counted():
+    async def scenario():
+        hub = DetectionHub(queue_size=1)
+        slow = hub.subscribe()
+        for i in range(4):
+            hub.publish({"type": "detections", "seq": i})
+        await asyncio.sleep(0)  # Run the call_soon_threadsafe deliveries
+        assert hub.get_stats()["messages_dropped"] == 3
+
+        hub.unsubscribe(slow)
+        hub.unsubscribe(slow)  # Repeated unsubscribe must not count twice
+        return hub.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["subscribers"] == 0
+    assert stats["messages_dropped"] == 3
@@ -0,0 +1,38 @@
+from detection_tracker import DetectionTracker
+
+
+def face(x, name="Unknown"):
+    return {"box": [x, 100, 50, 60], "name": name, "confidence": 0}
+
+
+def test_match_while_another_track_expires():
+    tracker = DetectionTracker(max_age=3.0)
+    first = tracker.update([face(100), face(500)], 100.0)
+    b = first[1]["track_id"]
+
+    assert [d["track_id"] for d in tracker.update([face(500)], 102.0)] == [b]
+    # Track a expires in this update; b must keep its id
+    assert [d["track_id"] for d in tracker.update([face(500)], 104.0)] == [b]
+    assert tracker.get_stats()["tracks"] == 1
+
+
+def test_new_track_while_another_expires_gets_its_own_id():
+    tracker = DetectionTracker(max_age=3.0)
+    first = tracker.update([face(100), face(500)], 100.0)
+    b = first[1]["track_id"]
+    tracker.update([face(500)], 102.0)
+
+    ids = [d["track_id"] for d in tracker.update([face(500), face(900)], 104.0)]
+    assert ids[0] == b
+    assert ids[1] not in (first[0]["track_id"], b)
+
+
+def test_boxes_interpolate_and_extrapolate():
+    tracker = DetectionTracker()
+    tracker.update([face(100)], 10.0)
+    tracker.update([face(200)], 11.0)
+
+    assert tracker.boxes_at(10.5)[0]["box"][0] == 150
+    assert tracker.boxes_at(11.5)[0]["box"][0] == 250
+    # Extrapolation stops after max_extrapolation seconds
+    assert tracker.boxes_at(20.0)[0]["box"][0] == 200 + 100 * tracker.max_extrapolation
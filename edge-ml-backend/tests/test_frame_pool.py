@@ -0,0 +1,39 @@
+import numpy as np
+
+from frame_pool import FramePool
+
+
+def test_buffer_is_not_reused_while_a_view_is_alive():
+    pool = FramePool(max_per_shape=4)
+    frame = pool.acquire((4, 4, 3))
+    frame[:] = 7
+    crop = frame[1:3, 1:3]
+    del frame
+
+    other = pool.acquire((4, 4, 3))
+    other[:] = 0
+    assert (crop == 7).all()
+    assert pool.get_stats()["reused"] == 0
+
+
+def test_buffer_is_reused_once_every_view_is_gone():
+    pool = FramePool(max_per_shape=4)
+    frame = pool.acquire((4, 4, 3))
+    view = frame.reshape(-1, 3)
+    del frame, view
+
+    pool.acquire((4, 4, 3))
+    stats = pool.get_stats()
+    assert stats["reused"] == 1
+    assert stats["pooled_arrays"] == 1
+
+
+def test_clear_forgets_buffers_still_leased():
+    pool = FramePool(max_per_shape=4)
+    frame = pool.acquire((4, 4), np.float32)
+    pool.clear()
+    del frame
+
+    assert pool.get_stats()["pooled_arrays"] == 0
+    pool.acquire((4, 4), np.float32)
+    assert pool.get_stats()["reused"] == 0
@@ -0,0 +1,42 @@
+import time
+
+from incident_recorder import IncidentRecorder, RECORD_FRAME
+
+
+class IdleStreamClient:
+    """Stream client stand-in that never produces frames"""
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        time.sleep(timeout or 0)
+        return None
+
+
+def test_late_detections_keep_the_index_sorted(tmp_path):
+    recorder = IncidentRecorder(IdleStreamClient(), directory=tmp_path, reorder_window=5.0)
+    recorder.start()
+    base = time.time()
+    for i in range(11):
+        recorder._enqueue(RECORD_FRAME, base + i * 0.1, b"frame")
+    # Detections arrive after the frames grabbed while the Jetson was inferring
+    recorder.record_detections({"detected_faces": []}, timestamp=base)
+    recorder.record_detections({"detected_faces": []}, timestamp=base + 1.2)
+    recorder.stop()
+
+    timestamps = [t for segment in recorder._segments for t in segment.timestamps]
+    assert timestamps == sorted(timestamps)
+    assert [d["timestamp"] for d in recorder.get_detections(base - 0.1, base + 0.5)] == [base]
+    kinds = [record.kind for record in recorder.iter_records(base - 0.1, base + 0.15)]
+    assert len(kinds) == 3  # Detection at base, then frames at base and base + 0.1
+
+
+def test_detections_too_late_for_the_window_are_counted(tmp_path):
+    recorder = IncidentRecorder(IdleStreamClient(), directory=tmp_path, reorder_window=0.0)
+    recorder.start()
+    base = time.time()
+    recorder._enqueue(RECORD_FRAME, base, b"frame")
+    time.sleep(0.3)
+    recorder.record_detections({"detected_faces": []}, timestamp=base - 1.0)
+    recorder.stop()
+
+    assert recorder.records_late == 1
+    assert recorder.get_detections(base - 2.0, base + 1.0) == []
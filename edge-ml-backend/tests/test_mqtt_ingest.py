@@ -0,0 +1,50 @@
+import json
+import threading
+import types
+
+import wire_formats
+from mqtt_stream_client import RTSPMQTTStreamClient
+
+
+def make_client():
+    return RTSPMQTTStreamClient(frame_source="synthetic://320x240@5")
+
+
+def message(payload):
+    return types.SimpleNamespace(payload=payload)
+
+
+def test_deeply_nested_payload_counts_as_decode_error(monkeypatch):
+    monkeypatch.setattr(wire_formats, "orjson", None)  # stdlib json raises RecursionError here
+    client = make_client()
+    client.process_payload(b"[" * 100000)
+
+    stats = client.ingest_queue.get_stats()
+    assert stats["decode_errors"] == 1
+    assert stats["decoded"] == 0
+
+
+def test_ingest_loop_survives_a_failing_payload(monkeypatch):
+    client = make_client()
+    handled = []
+    process_payload = client.process_payload
+
+    def flaky(payload, received_at=None):
+        if payload == b"boom":
+            raise RuntimeError("boom")
+        handled.append(payload)
+        process_payload(payload, received_at)
+
+    monkeypatch.setattr(client, "process_payload", flaky)
+    good = json.dumps({"timestamp": "", "detected_faces": []}).encode()
+    client.on_message(None, None, message(b"boom"))
+    client.on_message(None, None, message(good))
+
+    client.is_running = False  # Drain what is queued, then return
+    worker = threading.Thread(target=client.ingest_loop, daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert handled == [good]
+    assert client.ingest_queue.get_stats()["dispatched"] == 1
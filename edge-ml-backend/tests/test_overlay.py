@@ -0,0 +1,30 @@
+import numpy as np
+
+from overlay import OverlayRenderer
+
+
+def detection(x):
+    return {"person_id": "p1", "name": "Alice", "confidence": 90, "box": [x, 40, 60, 120]}
+
+
+def test_moving_detections_are_drawn_without_building_layers():
+    renderer = OverlayRenderer()
+    for step in range(60):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        drawn = renderer.draw(frame, [detection(20 + step * 3)], 1.0, 1.0)
+        assert drawn[40, 20 + step * 3].any()
+
+    assert renderer.layers_built == 0
+    assert renderer.direct_draws == 60
+    assert len(renderer.labels._cache) == 1
+
+
+def test_repeated_detections_reuse_one_layer_with_identical_pixels():
+    renderer = OverlayRenderer()
+    frames = [renderer.draw(np.zeros((360, 640, 3), dtype=np.uint8), [detection(100)], 1.0, 1.0)
+              for _ in range(10)]
+
+    assert renderer.direct_draws == 1
+    assert renderer.layers_built == 1
+    for frame in frames[1:]:
+        assert np.array_equal(frame, frames[0])
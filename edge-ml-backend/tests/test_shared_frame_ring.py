@@ -0,0 +1,39 @@
+import threading
+import time
+
+import numpy as np
+
+from shared_frame_ring import SharedFrameRing
+
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_view_overwritten_by_the_writer_is_not_intact():
+    ring = SharedFrameRing(capacity=2, max_width=6, max_height=4)
+    try:
+        ring.put(frame(1))
+        held = ring.latest()
+        assert ring.intact(held)
+
+        ring.put(frame(2))
+        ring.put(frame(3))  # Reuses held's slot
+        assert not ring.intact(held)
+        assert ring.intact(ring.latest())
+    finally:
+        ring.close()
+
+
+def test_publish_wakes_waiting_readers():
+    ring = SharedFrameRing(capacity=2, max_width=6, max_height=4, status_interval=10.0)
+    ring.start_watching()
+    try:
+        threading.Timer(0.1, ring.put, args=(frame(5),)).start()
+        started = time.monotonic()
+        buffered = ring.wait_for_newer(0, timeout=5.0)
+        assert buffered is not None and buffered.frame[0, 0, 0] == 5
+        assert time.monotonic() - started < 1.0
+    finally:
+        ring.stop_watching()
+        ring.close()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from mqtt_stream_client import RTSPMQTTStreamClient
+from stream_broadcaster import SnapshotCache
+
+
+def test_detection_update_on_the_same_frame_is_re_encoded():
+    client = RTSPMQTTStreamClient(frame_source="synthetic://320x240@5")
+    client.TRACKING_ENABLED = False
+    client.frame_buffer.put(np.zeros((240, 320, 3), dtype=np.uint8))
+    buffered = client.frame_buffer.latest()
+    cache = SnapshotCache(client)
+
+    before = cache.get_image(buffered)
+    assert cache.get_image(buffered) is before
+    client.latest_detections = [{"person_id": "p1", "name": "Alice", "confidence": 90, "box": [20, 20, 80, 120]}]
+    after = cache.get_image(buffered)
+
+    assert after != before
+    assert cache.snapshots_encoded == 2
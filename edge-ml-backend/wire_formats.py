@@ -0,0 +1,105 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+
+try:
+    import orjson
+except ImportError:  # In requirements.txt; stdlib json is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: pip install msgpack
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+class WireFormat(ABC):
+    """Serialization used on a WebSocket or MQTT channel"""
+    name = None
+    binary = False  # True: sent as binary WebSocket frames (bytes), else text frames (str)
+
+    @abstractmethod
+    def dumps(self, message):
+        """Serialize a message to str (text formats) or bytes (binary formats)"""
+
+    @abstractmethod
+    def loads(self, data):
+        """Parse str or bytes; raises ValueError on malformed input"""
+
+
+class JSONFormat(WireFormat):
+    """JSON, through orjson when it is installed"""
+    name = "json"
+
+    def dumps(self, message):
+        if orjson is not None:
+            return orjson.dumps(message).decode()
+        return json.dumps(message, separators=(",", ":"))
+
+    def loads(self, data):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MessagePackFormat(WireFormat):
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+
+    def dumps(self, message):
+        return msgpack.packb(message)
+
+    def loads(self, data):
+        try:
+            return msgpack.unpackb(data)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ValueError(str(e)) from e
+
+
+FORMAT_CLASSES = {cls.name: cls for cls in (JSONFormat, MessagePackFormat)}
+_formats = {}
+
+
+def available_formats():
+    """Names of the wire formats usable in this environment"""
+    return [name for name in FORMAT_CLASSES if name != "msgpack" or msgpack is not None]
+
+
+def get_format(name) -> WireFormat:
+    """Shared wire format instance by name (ValueError if unknown or not installed)"""
+    wire_format = _formats.get(name)
+    if wire_format is None:
+        if name not in available_formats():
+            raise ValueError(f"Unknown or unavailable wire format '{name}', expected one of {available_formats()}")
+        wire_format = _formats[name] = FORMAT_CLASSES[name]()
+    return wire_format
+
+
+class FormatStats:
+    """Per-format message count, bytes and CPU time, for status endpoints"""
+
+    def __init__(self):
+        self._totals = {}  # name -> [messages, bytes, seconds]
+
+    def record(self, name, size, seconds):
+        totals = self._totals.setdefault(name, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += size
+        totals[2] += seconds
+
+    def get_stats(self):
+        return {
+            name: {
+                "messages": messages,
+                "bytes": size,
+                "mean_bytes": size // max(1, messages),
+                "mean_us": round(seconds * 1e6 / max(1, messages), 1)
+            }
+            for name, (messages, size, seconds) in list(self._totals.items())
+        }
@@ -35,6 +35,7 @@ const EdgeMLDashboard = () => {
   const fileInputRef = useRef(null);
   const streamImgRef = useRef(null);
   const websocketRef = useRef(null);
+  const detectionStateRef = useRef({});
 
   // Updated API base to match your backend
   const API_BASE = 'http://10.70.0.64:8080/api';
@@ -90,6 +91,14 @@ const EdgeMLDashboard = () => {
 
           if (data.type === 'detections') {
             setDetectionData(data.data);
+          } else if (data.type === 'detections_snapshot') {
+            detectionStateRef.current = { ...data.detections };
+            setDetectionData(Object.values(detectionStateRef.current));
+          } else if (data.type === 'detections_delta') {
+            const state = { ...detectionStateRef.current, ...data.added, ...data.updated };
+            data.removed.forEach(key => delete state[key]);
+            detectionStateRef.current = state;
+            setDetectionData(Object.values(state));
           } else if (data.type === 'status') {
             setStreamStats({
               mqtt_connected: data.mqtt_connected,